@@ -1,6 +1,9 @@
 # This is the initialization file for Fluff. You're meant to run this.
 
 # Imports.
+import time
+
+boot_started = time.perf_counter()
 import os
 import sys
 import logging
@@ -10,10 +13,20 @@ import aiohttp
 import config
 import discord
 import datetime
-import itertools
+from collections import OrderedDict
 from discord.ext import commands
-from helpers.datafiles import fill_profile, get_botfile
+from helpers.botbans import load_botbans, is_botbanned
+from helpers.prefixes import (
+    load_prefixes,
+    match_prefixes,
+    get_userprefixes,
+    match_alias,
+)
 from helpers.errors import handle_code_error, handle_command_error
+from helpers.pipeline import run_stages
+from helpers.loadtimes import load_times, timed
+
+load_times["imports"] = time.perf_counter() - boot_started
 
 
 # Setup temp dir
@@ -28,7 +41,9 @@ log_format = logging.Formatter(
 )
 stdout_handler = logging.StreamHandler(sys.stdout)
 stdout_handler.setFormatter(log_format)
-logfile_handler = logging.FileHandler("logs/fluff.log", mode="w")
+# Opened on the first record, so the render process, which imports this
+# file again when it's spawned, doesn't empty the bot's log.
+logfile_handler = logging.FileHandler("logs/fluff.log", mode="w", delay=True)
 logfile_handler.setFormatter(log_format)
 log = logging.getLogger("discord")
 log.setLevel(logging.INFO)
@@ -37,37 +52,42 @@ log.addHandler(logfile_handler)
 
 
 # Utility functions.
-def cap_permutations(s):
-    # thank you to https://stackoverflow.com/a/11165671
-    lu_sequence = ((c.lower(), c.upper()) for c in s)
-    return ["".join(x) for x in itertools.product(*lu_sequence)]
+def get_prefix(bot, message):
+    prefixes = match_prefixes(message.content) + get_userprefixes(message.author.id)
+    return commands.when_mentioned_or(*prefixes)(bot, message)
 
 
-def get_userprefix(uid):
-    profile = fill_profile(uid)
-    if not profile:
-        return []
-    return profile["prefixes"]
+async def get_command_context(message):
+    ctx = await bot.get_context(message)
+    if not ctx.valid and ctx.prefix:
+        content = message.content[len(ctx.prefix) :]
+        alias = match_alias(message.author.id, content)
+        if alias:
+            message.content = (
+                message.content[: len(ctx.prefix)] + alias[1] + content[len(alias[0]) :]
+            )
+            ctx = await bot.get_context(message)
+    return ctx
 
 
-def get_useralias(uid):
-    profile = fill_profile(uid)
-    if not profile:
-        return []
-    return profile["aliases"]
+# Messages that weren't commands, by ID, to when edits to them stop counting.
+# Fixing a typo in one of these runs it, same as sending it again.
+pending_edits = OrderedDict()
+edit_timeout = 15.0
 
 
-def get_prefix(bot, message):
-    prefixes = []
-    for prefix in config.prefixes:
-        prefixes += cap_permutations(prefix)
-    userprefixes = get_userprefix(message.author.id)
-    if userprefixes is not None:
-        return commands.when_mentioned_or(*prefixes + userprefixes)(bot, message)
-    return commands.when_mentioned_or(*prefixes)(bot, message)
+def track_edits(message):
+    now = time.monotonic()
+    # Every entry lives as long, so the oldest ones are always in front.
+    while pending_edits and next(iter(pending_edits.values())) <= now:
+        pending_edits.popitem(last=False)
+    pending_edits[message.id] = now + edit_timeout
+    pending_edits.move_to_end(message.id)
 
 
 # Bot setup.
+load_prefixes(config.prefixes)
+load_botbans()
 intents = discord.Intents.all()
 intents.typing = False
 
@@ -108,49 +128,34 @@ async def on_command(ctx):
     log.info(log_text)
 
 
+@bot.listen("on_message")
+async def dispatch_stages(message):
+    await bot.wait_until_ready()
+    await run_stages(bot, message)
+
+
 @bot.event
 async def on_message(message):
     await bot.wait_until_ready()
 
-    if message.author.bot:
-        return
-    if (
-        "botban" in get_botfile("botusers")
-        and message.author.id in get_botfile("botusers")["botban"]
-    ):
+    if message.author.bot or is_botbanned(message.author.id):
         return
 
-    ctx = await bot.get_context(message)
+    ctx = await get_command_context(message)
     if not ctx.valid:
+        return track_edits(message)
+    await bot.invoke(ctx)
 
-        def check(b, a):
-            return a.id == message.id
-
-        while True:
-            if ctx.prefix:
-                aliases = get_useralias(message.author.id)
-                for alias in aliases:
-                    command, alias = list(alias.items())[0]
-                    if message.content[len(ctx.prefix) :].startswith(alias):
-                        message.content = message.content[
-                            : len(ctx.prefix)
-                        ] + message.content[len(ctx.prefix) :].replace(
-                            alias, command, 1
-                        )
-                        ctx = await bot.get_context(message)
-                        break
-            if ctx.valid:
-                break
-            try:
-                author, message = await bot.wait_for(
-                    "message_edit", timeout=15.0, check=check
-                )
-            except (asyncio.TimeoutError, discord.errors.NotFound):
-                return
-            else:
-                ctx = await bot.get_context(message)
-                if ctx.valid:
-                    break
+
+@bot.listen("on_message_edit")
+async def retry_edited(before, after):
+    expires = pending_edits.pop(after.id, None)
+    if not expires or expires <= time.monotonic():
+        return
+
+    ctx = await get_command_context(after)
+    if not ctx.valid:
+        return track_edits(after)
     await bot.invoke(ctx)
 
 
@@ -173,7 +178,8 @@ async def main():
             if os.path.isfile("cogs/" + f) and f[-3:] == ".py"
         ]:
             try:
-                await bot.load_extension(cog)
+                with timed(cog):
+                    await bot.load_extension(cog)
             except:
                 log.exception(f"Failed to load cog {cog}.")
         await bot.start(config.token)
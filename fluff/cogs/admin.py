@@ -16,8 +16,18 @@ from contextlib import redirect_stdout
 from helpers.embeds import stock_embed
 from helpers.checks import ismanager
 from helpers.sv_config import get_config
-from helpers.datafiles import get_botfile, set_botfile, get_guildfile
+from helpers.datafiles import (
+    get_guildfile,
+    uncache,
+    flush_files,
+    load_storage,
+    migrate_storage,
+)
 from helpers.placeholders import random_msg
+from helpers.prefixes import forget_userprefixes, forget_useraliases
+from helpers.botbans import load_botbans, add_botban, remove_botban
+from helpers.pipeline import stages, timings
+from helpers.loadtimes import load_times, timed
 
 
 class Admin(Cog):
@@ -174,6 +184,7 @@ class Admin(Cog):
         be a massive security risk.
 
         No arguments."""
+        flush_files()
         shutil.make_archive("data_export", "zip", "data")
         try:
             await ctx.author.send(
@@ -199,8 +210,79 @@ class Admin(Cog):
             shutil.rmtree("data")
         shutil.unpack_archive("data.zip", "data")
         os.remove("data.zip")
+        load_storage()
+        forget_userprefixes()
+        forget_useraliases()
+        load_botbans()
+        if self.bot.get_cog("Timer"):
+            self.bot.get_cog("Timer").load_jobs()
+        if self.bot.get_cog("Reply"):
+            self.bot.get_cog("Reply").replyprefs.clear()
+        if self.bot.get_cog("ModToss"):
+            self.bot.get_cog("ModToss").session_index.clear()
         await ctx.reply(content=f"Data saved.", mention_author=False)
 
+    @commands.check(ismanager)
+    @commands.command()
+    async def migratedata(self, ctx):
+        """This imports the data files into the storage database.
+
+        Only needed once, after switching `storage` to SQLite.
+
+        No arguments."""
+        counts = migrate_storage()
+        if counts is None:
+            return await ctx.reply(
+                content="Storage is set to JSON, there's nothing to migrate to.",
+                mention_author=False,
+            )
+        await ctx.reply(
+            content="Data migrated.\n"
+            + "\n".join(f"- `{count}` {kind} files" for kind, count in counts.items()),
+            mention_author=False,
+        )
+
+    @commands.check(ismanager)
+    @commands.command(aliases=["stages"])
+    async def pipeline(self, ctx):
+        """This shows how long each message stage takes.
+
+        Counted since the bot started.
+
+        No arguments."""
+        lines = []
+        for name in stages:
+            runs, total, slowest = timings.get(name, (0, 0.0, 0.0))
+            average = total / runs * 1000 if runs else 0
+            lines.append(
+                f"- `{name}`: `{runs}` runs, `{average:.2f}ms` average, `{slowest * 1000:.2f}ms` slowest"
+            )
+        await ctx.reply(
+            content="**Message stages**\n" + "\n".join(lines),
+            mention_author=False,
+        )
+
+    @commands.check(ismanager)
+    @commands.command(aliases=["startup"])
+    async def loadtimes(self, ctx):
+        """This shows how long things took to load.
+
+        Cogs are timed on every (re)load, assets and
+        heavy libraries the first time they're used.
+
+        No arguments."""
+        lines = [
+            f"- `{name}`: `{seconds * 1000:.1f}ms`"
+            for name, seconds in sorted(
+                load_times.items(), key=lambda item: item[1], reverse=True
+            )
+        ]
+        await ctx.reply(
+            content=f"**Load times** (`{sum(load_times.values()):.2f}s` total)\n"
+            + "\n".join(lines),
+            mention_author=False,
+        )
+
     @commands.bot_has_permissions(attach_files=True)
     @commands.check(ismanager)
     @commands.command(aliases=["getserverdata"])
@@ -214,6 +296,7 @@ class Admin(Cog):
         if not server:
             server = ctx.guild
         try:
+            flush_files()
             shutil.make_archive(f"data/{server.id}", "zip", f"data/servers/{server.id}")
             sdata = discord.File(f"data/{server.id}.zip")
             await ctx.message.reply(
@@ -248,6 +331,9 @@ class Admin(Cog):
             shutil.rmtree(f"data/servers/{server.id}")
         shutil.unpack_archive(f"data/{server.id}.zip", f"data/servers/{server.id}")
         os.remove(f"data/{server.id}.zip")
+        uncache(f"data/servers/{server.id}")
+        if self.bot.get_cog("ModToss"):
+            self.bot.get_cog("ModToss").session_index.pop(server.id, None)
         await ctx.reply(content=f"{server.name}'s data saved.", mention_author=False)
 
     @commands.bot_has_permissions(attach_files=True)
@@ -263,6 +349,7 @@ class Admin(Cog):
         if not user:
             user = ctx.author
         try:
+            flush_files()
             shutil.make_archive(f"data/{user.id}", "zip", f"data/users/{user.id}")
             sdata = discord.File(f"data/{user.id}.zip")
             await ctx.message.reply(
@@ -296,7 +383,12 @@ class Admin(Cog):
         if os.path.exists(f"data/users/{user.id}"):
             shutil.rmtree(f"data/users/{user.id}")
         shutil.unpack_archive(f"data/{user.id}.zip", f"data/users/{user.id}")
-        os.remove(f"data/users/{user.id}")
+        os.remove(f"data/{user.id}.zip")
+        uncache(f"data/users/{user.id}")
+        forget_userprefixes(user.id)
+        forget_useraliases(user.id)
+        if self.bot.get_cog("Reply"):
+            self.bot.get_cog("Reply").replyprefs.pop(user.id, None)
         await ctx.reply(content=f"{user}'s data saved.", mention_author=False)
 
     @commands.bot_has_permissions(attach_files=True)
@@ -415,15 +507,10 @@ class Admin(Cog):
 
         - `user`
         The user to bar."""
-        botusers = get_botfile("botusers")
-        if "botban" not in botusers:
-            botusers["botban"] = []
-        if user.id in botusers["botban"]:
+        if not add_botban(user.id):
             return await ctx.reply(
                 content="This user is already botbanned.", mention_author=False
             )
-        botusers["botban"].append(user.id)
-        set_botfile("botusers", json.dumps(botusers))
         return await ctx.reply(
             content="This user is now botbanned.", mention_author=False
         )
@@ -437,15 +524,10 @@ class Admin(Cog):
 
         - `user`
         The user to unbar."""
-        botusers = get_botfile("botusers")
-        if "botban" not in botusers:
-            botusers["botban"] = []
-        if user.id not in botusers["botban"]:
+        if not remove_botban(user.id):
             return await ctx.reply(
                 content="This user is not already botbanned.", mention_author=False
             )
-        botusers["botban"].remove(user.id)
-        set_botfile("botusers", json.dumps(botusers))
         return await ctx.reply(
             content="This user is now unbotbanned.", mention_author=False
         )
@@ -643,7 +725,8 @@ class Admin(Cog):
 
                 try:
                     await self.bot.unload_extension(cog_name)
-                    await self.bot.load_extension(cog_name)
+                    with timed(cog_name):
+                        await self.bot.load_extension(cog_name)
                     self.bot.log.info(f"Reloaded cog {cog}")
                     await ctx.message.reply(
                         content=f":white_check_mark: `{cog}` successfully reloaded.",
@@ -667,7 +750,8 @@ class Admin(Cog):
         - `ext`
         The cog to load."""
         try:
-            await self.bot.load_extension(ext)
+            with timed(ext):
+                await self.bot.load_extension(ext)
         except:
             if len(traceback.format_exc()) > 2000:
                 parts = self.bot.slice_message(
@@ -718,7 +802,8 @@ class Admin(Cog):
 
         try:
             await self.bot.unload_extension(ext)
-            await self.bot.load_extension(ext)
+            with timed(ext):
+                await self.bot.load_extension(ext)
         except:
             await ctx.message.reply(
                 content=f":x: Cog reloading failed, traceback: "
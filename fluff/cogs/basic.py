@@ -1,12 +1,13 @@
 import time
+import bisect
 import discord
 import io
 import asyncio
-import matplotlib
-import matplotlib.pyplot as plt
 import typing
 import random
 import platform
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from discord.ext import commands
 from discord.ext.commands import Cog
 from helpers.checks import ismod, ismanager
@@ -15,11 +16,105 @@ from helpers.sv_config import get_config
 import aiohttp
 from helpers.placeholders import random_msg
 
+# Rendered join graphs are sent again until this many members have joined
+# or left, or until they're this many seconds old.
+joingraph_changes = 25
+joingraph_ttl = 6 * 60 * 60
+
+
+def render_joingraph(joindates, joincounts):
+    # Runs in the render process, which is the only one that needs matplotlib.
+    from matplotlib.figure import Figure
+
+    figure = Figure()
+    figure.subplots().plot(joindates, joincounts)
+    joingraph = io.BytesIO()
+    figure.savefig(joingraph, format="png", bbox_inches="tight")
+    return joingraph.getvalue()
+
 
 class Basic(Cog):
     def __init__(self, bot):
         self.bot = bot
-        matplotlib.use("agg")
+        # Started the first time a graph is rendered.
+        self.renderer = None
+        # Guild ID to (PNG, join index changes when rendered, render time).
+        self.joingraphs = {}
+        # Guild ID to how many joins and leaves it has seen.
+        self.joinchanges = {}
+        # Guild ID to its members as sorted (joined_at, member ID) pairs,
+        # built the first time they're needed and kept by the listeners below.
+        self.joins = {}
+
+    def join_index(self, guild):
+        if guild.id not in self.joins:
+            self.joins[guild.id] = sorted(
+                (m.joined_at, m.id) for m in guild.members if m.joined_at
+            )
+        return self.joins[guild.id]
+
+    def cog_unload(self):
+        if self.renderer:
+            self.renderer.shutdown(wait=False, cancel_futures=True)
+
+    async def get_joingraph(self, guild):
+        changes = self.joinchanges.get(guild.id, 0)
+        if guild.id in self.joingraphs:
+            png, rendered_changes, rendered = self.joingraphs[guild.id]
+            if (
+                changes - rendered_changes <= joingraph_changes
+                and time.time() - rendered < joingraph_ttl
+            ):
+                return png
+
+        # Joins are in order, so the count at a date is where it ends.
+        joindates = []
+        joincounts = []
+        for i, (joined_at, _) in enumerate(self.join_index(guild)):
+            if joindates and joindates[-1] == joined_at.date():
+                joincounts[-1] = i + 1
+            else:
+                joindates.append(joined_at.date())
+                joincounts.append(i + 1)
+
+        if not self.renderer:
+            # Forking would copy the whole running bot, event loop and sockets
+            # included, so the render process starts fresh instead.
+            self.renderer = ProcessPoolExecutor(
+                max_workers=1, mp_context=multiprocessing.get_context("spawn")
+            )
+        png = await asyncio.get_running_loop().run_in_executor(
+            self.renderer, render_joingraph, joindates, joincounts
+        )
+        self.joingraphs[guild.id] = (png, changes, time.time())
+        return png
+
+    @Cog.listener()
+    async def on_member_join(self, member):
+        self.joinchanges[member.guild.id] = self.joinchanges.get(member.guild.id, 0) + 1
+        if member.guild.id in self.joins and member.joined_at:
+            bisect.insort(self.joins[member.guild.id], (member.joined_at, member.id))
+
+    @Cog.listener()
+    async def on_member_remove(self, member):
+        self.joinchanges[member.guild.id] = self.joinchanges.get(member.guild.id, 0) + 1
+        if member.guild.id not in self.joins or not member.joined_at:
+            return
+        joins = self.joins[member.guild.id]
+        idx = bisect.bisect_left(joins, (member.joined_at, member.id))
+        if idx < len(joins) and joins[idx][1] == member.id:
+            del joins[idx]
+
+    @Cog.listener()
+    async def on_guild_available(self, guild):
+        # Joins and leaves may have been missed while the guild was away.
+        self.joins.pop(guild.id, None)
+
+    @Cog.listener()
+    async def on_guild_remove(self, guild):
+        self.joins.pop(guild.id, None)
+        self.joingraphs.pop(guild.id, None)
+        self.joinchanges.pop(guild.id, None)
 
     """
     TODO: stop this from being stupid
@@ -448,6 +543,22 @@ class Basic(Cog):
 only to use with backups if the bot explodes or something""",
                 "inline": False,
             },
+            {
+                "name": "pls migratedata",
+                "value": """imports data files into the storage database
+only needed once after switching storage to sqlite""",
+                "inline": False,
+            },
+            {
+                "name": "pls pipeline",
+                "value": """shows how long each message stage takes""",
+                "inline": True,
+            },
+            {
+                "name": "pls loadtimes",
+                "value": """shows how long cogs, assets and libraries took to load""",
+                "inline": True,
+            },
             {
                 "name": "pls threadlock [channel]",
                 "value": """locks all threads in one channel""",
@@ -541,19 +652,7 @@ the true/false portion tells me whether to reload cogs""",
 
         No arguments."""
         async with ctx.channel.typing():
-            rawjoins = [m.joined_at.date() for m in ctx.guild.members]
-            joindates = sorted(list(dict.fromkeys(rawjoins)))
-            joincounts = []
-            for i, d in enumerate(joindates):
-                if i != 0:
-                    joincounts.append(joincounts[i - 1] + rawjoins.count(d))
-                else:
-                    joincounts.append(rawjoins.count(d))
-            plt.plot(joindates, joincounts)
-            joingraph = io.BytesIO()
-            plt.savefig(joingraph, bbox_inches="tight")
-            joingraph.seek(0)
-            plt.close()
+            joingraph = io.BytesIO(await self.get_joingraph(ctx.guild))
         await ctx.reply(
             file=discord.File(joingraph, filename="joingraph.png"), mention_author=False
         )
@@ -568,22 +667,23 @@ the true/false portion tells me whether to reload cogs""",
         - `target`
         Who you want to see the joinscore of.
         This can also be an index number, like `1`."""
-        members = sorted(ctx.guild.members, key=lambda v: v.joined_at)
+        joins = self.join_index(ctx.guild)
         if not target:
-            memberidx = members.index(ctx.author) + 1
-        elif type(target) == discord.Member:
-            memberidx = members.index(target) + 1
+            target = ctx.author
+        if type(target) == discord.Member:
+            memberidx = bisect.bisect_left(joins, (target.joined_at, target.id)) + 1
         else:
             memberidx = target
         message = ""
-        for idx, m in enumerate(members):
-            if memberidx - 6 <= idx <= memberidx + 4:
-                user = self.bot.pacify_name(str(m))
-                message = (
-                    f"{message}\n`{idx+1}` **{user}**"
-                    if memberidx == idx + 1
-                    else f"{message}\n`{idx+1}` {user}"
-                )
+        start = max(memberidx - 6, 0)
+        end = max(memberidx + 5, 0)
+        for idx, (_, member_id) in enumerate(joins[start:end], start):
+            user = self.bot.pacify_name(str(ctx.guild.get_member(member_id)))
+            message = (
+                f"{message}\n`{idx+1}` **{user}**"
+                if memberidx == idx + 1
+                else f"{message}\n`{idx+1}` {user}"
+            )
         await ctx.reply(content=message, mention_author=False)
 
     @commands.cooldown(1, 5, type=commands.BucketType.default)
@@ -13,34 +13,131 @@ class Common(Cog):
         self.bot.pull_channel = self.pull_channel
         self.bot.pull_category = self.pull_category
         self.bot.pacify_name = self.pacify_name
+        # Per guild, what each name or ID given to pull_* resolved to, and the
+        # name index used for names. Both are dropped when the guild's roles,
+        # channels or threads change, so config values resolve once per change.
+        self.resolved = {}
+        self.names = {}
+
+    def forget_guild(self, guild):
+        self.resolved.pop(guild.id, None)
+        self.names.pop(guild.id, None)
+
+    def get_names(self, guild):
+        if guild.id not in self.names:
+            # Earlier entries win, as with discord.utils.get.
+            names = {"role": {}, "channel": {}, "category": {}}
+            for role in guild.roles:
+                names["role"].setdefault(role.name, role)
+            for channel in (
+                list(guild.text_channels)
+                + list(guild.voice_channels)
+                + list(guild.threads)
+            ):
+                names["channel"].setdefault(channel.name, channel)
+            for category in guild.categories:
+                names["category"].setdefault(category.name, category)
+            self.names[guild.id] = names
+        return self.names[guild.id]
+
+    def resolve(self, guild, kind, key, find):
+        resolved = self.resolved.setdefault(guild.id, {})
+        if (kind, key) in resolved:
+            return resolved[(kind, key)]
+        found = find()
+        # Misses aren't kept, what's missing may just not be cached yet.
+        if found is not None:
+            resolved[(kind, key)] = found
+        return found
 
     def pull_role(self, guild, role):
         if isinstance(role, str):
-            role = discord.utils.get(guild.roles, name=role)
-        else:
-            role = guild.get_role(role)
-        return role
+            return self.resolve(
+                guild, "role", role, lambda: self.get_names(guild)["role"].get(role)
+            )
+        return self.resolve(guild, "role", role, lambda: guild.get_role(role))
 
     def pull_channel(self, guild, channel):
         if isinstance(channel, str):
-            channel = discord.utils.get(
-                list(guild.text_channels)
-                + list(guild.voice_channels)
-                + list(guild.threads),
-                name=channel,
+            return self.resolve(
+                guild,
+                "channel",
+                channel,
+                lambda: self.get_names(guild)["channel"].get(channel),
             )
-        else:
-            channel = guild.get_channel_or_thread(channel)
-        return channel
+        return self.resolve(
+            guild, "channel", channel, lambda: guild.get_channel_or_thread(channel)
+        )
 
     def pull_category(self, guild, category):
         if isinstance(category, str):
-            category = discord.utils.get(guild.categories, name=category)
-        else:
-            category = guild.get_channel(category)
-            if category and type(category) != discord.CategoryChannel:
-                category = None
-        return category
+            return self.resolve(
+                guild,
+                "category",
+                category,
+                lambda: self.get_names(guild)["category"].get(category),
+            )
+
+        def find():
+            found = guild.get_channel(category)
+            if found and type(found) != discord.CategoryChannel:
+                return None
+            return found
+
+        return self.resolve(guild, "category", category, find)
+
+    @Cog.listener()
+    async def on_guild_channel_create(self, channel):
+        self.forget_guild(channel.guild)
+
+    @Cog.listener()
+    async def on_guild_channel_delete(self, channel):
+        self.forget_guild(channel.guild)
+
+    @Cog.listener()
+    async def on_guild_channel_update(self, before, after):
+        self.forget_guild(after.guild)
+
+    @Cog.listener()
+    async def on_guild_role_create(self, role):
+        self.forget_guild(role.guild)
+
+    @Cog.listener()
+    async def on_guild_role_delete(self, role):
+        self.forget_guild(role.guild)
+
+    @Cog.listener()
+    async def on_guild_role_update(self, before, after):
+        self.forget_guild(after.guild)
+
+    @Cog.listener()
+    async def on_thread_create(self, thread):
+        self.forget_guild(thread.guild)
+
+    @Cog.listener()
+    async def on_thread_join(self, thread):
+        self.forget_guild(thread.guild)
+
+    @Cog.listener()
+    async def on_thread_update(self, before, after):
+        self.forget_guild(after.guild)
+
+    @Cog.listener()
+    async def on_thread_remove(self, thread):
+        self.forget_guild(thread.guild)
+
+    @Cog.listener()
+    async def on_raw_thread_delete(self, payload):
+        self.resolved.pop(payload.guild_id, None)
+        self.names.pop(payload.guild_id, None)
+
+    @Cog.listener()
+    async def on_guild_available(self, guild):
+        self.forget_guild(guild)
+
+    @Cog.listener()
+    async def on_guild_remove(self, guild):
+        self.forget_guild(guild)
 
     def pacify_name(self, name):
         return discord.utils.escape_markdown(name.replace("@", "@ "))
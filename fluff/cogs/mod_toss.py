@@ -2,16 +2,33 @@
 import discord
 import json
 import os
+import sys
+import glob
 import asyncio
-import zipfile
 from datetime import datetime, timezone, timedelta
-from discord.ext import commands
+from discord.ext import commands, tasks
 from discord.ext.commands import Cog
 from io import BytesIO
 from helpers.checks import ismod
-from helpers.datafiles import toss_userlog, get_tossfile, set_tossfile
+from helpers.datafiles import (
+    toss_userlog,
+    toss_userlogs,
+    get_tossfile,
+    set_tossfile,
+)
 from helpers.placeholders import random_msg
-from helpers.archive import log_channel
+from helpers.archive import (
+    log_channel,
+    finish_text,
+    count_zip,
+    message_record,
+    start_journal,
+    append_journal,
+    finish_journal,
+    drop_journal,
+    journal_files_path,
+)
+from helpers.errors import throw_error
 from helpers.embeds import (
     stock_embed,
     mod_embed,
@@ -20,7 +37,8 @@ from helpers.embeds import (
     joinedat_embed,
 )
 from helpers.sv_config import get_config
-from helpers.google import upload
+from helpers.google import upload, upload_worker
+from helpers.pipeline import add_stage, remove_stage
 
 
 class ModToss(Cog):
@@ -28,8 +46,39 @@ class ModToss(Cog):
         self.bot = bot
         self.busy = False
         self.poketimers = dict()
+        # Archives still being counted and uploaded, by session channel ID.
+        self.archiving = {}
         # self.spamcounter = {}
         self.nocfgmsg = "Tossing isn't enabled for this server."
+        # Guild ID to (tossed, left), see get_sessions. Dropped whenever
+        # the guild's tosses are saved.
+        self.session_index = {}
+        # Session folders of the toss channels being journaled, by channel ID.
+        self.journals = {
+            int(os.path.basename(os.path.dirname(path))): os.path.dirname(path)
+            for path in glob.glob(
+                "data/servers/*/toss/archives/sessions/*/journal.jsonl"
+            )
+        }
+        if bot.is_ready():
+            # Whatever happened while this was unloaded wasn't journaled.
+            self.mark_gaps()
+        self.uploader.start()
+        add_stage("journal", self.journal_stage, users_only=False)
+
+    def cog_unload(self):
+        remove_stage("journal")
+        self.uploader.cancel()
+
+    @tasks.loop()
+    async def uploader(self):
+        await self.bot.wait_until_ready()
+        try:
+            await upload_worker(self.bot.session)
+        except:
+            # Don't lose the queue if something goes wrong, try again in a bit.
+            await throw_error(self.bot, sys.exc_info(), "ModToss.uploader", 0)
+            await asyncio.sleep(60)
 
     def enabled(self, g):
         return all(
@@ -40,6 +89,43 @@ class ModToss(Cog):
             )
         )
 
+    def session_path(self, channel):
+        return f"data/servers/{channel.guild.id}/toss/archives/sessions/{channel.id}"
+
+    def mark_gaps(self):
+        for session_path in self.journals.values():
+            append_journal(session_path, {"type": "gap"})
+
+    def role_list(self, roles):
+        if not roles:
+            return "None"
+        return ",".join(reversed([f"<@&{role.id}>" for role in roles]))
+
+    def batch_toss_embeds(self, ctx, toss_channel, tossed):
+        """Sums up a toss of many users, twenty to an embed."""
+        embeds = []
+        users = list(tossed.items())
+        for i in range(0, len(users), 20):
+            embed = stock_embed(self.bot)
+            embed.color = ctx.author.color
+            embed.title = f"🚷 Toss ({len(tossed)} users)"
+            embed.description = f"{len(tossed)} users were tossed by {ctx.author.mention} [`#{ctx.channel.name}`] [[Jump]({ctx.message.jump_url})]\n> This toss takes place in {toss_channel.mention}..."
+            for us, (failed_roles, previous_roles) in users[i : i + 20]:
+                value = (
+                    f"{us.mention} ({us.id})\n"
+                    + f"⏰ <t:{int(us.created_at.timestamp())}:R> ⏱️ <t:{int(us.joined_at.timestamp())}:R>\n"
+                    + f"🎨 {self.role_list(previous_roles)}"
+                )
+                if failed_roles:
+                    value += f"\n🚫 {self.role_list(failed_roles)}"
+                if len(value) > 200:
+                    value = value[:197] + "..."
+                embed.add_field(
+                    name=self.bot.pacify_name(str(us)), value=value, inline=False
+                )
+            embeds.append(embed)
+        return embeds
+
     def username_system(self, user):
         return (
             "**"
@@ -74,20 +160,40 @@ class ModToss(Cog):
                     return len([r for r in member.roles if not (r.managed)]) == 2
                 return True
 
-    def get_session(self, member):
-        tosses = get_tossfile(member.guild.id, "tosses")
-        if not tosses:
-            return None
-        session = None
-        if "LEFTGUILD" in tosses and str(member.id) in tosses["LEFTGUILD"]:
-            session = False
+    def get_sessions(self, guild_id):
+        """Returns who's tossed where in a guild, as two dicts by member ID.
+
+        The first has the session channel of each tossed member, the second
+        has the session each LEFTGUILD member left from, or None."""
+        if guild_id in self.session_index:
+            return self.session_index[guild_id]
+
+        tosses = get_tossfile(guild_id, "tosses")
+        tossed = {}
+        left = dict.fromkeys(tosses.get("LEFTGUILD", {}))
         for channel in tosses:
             if channel == "LEFTGUILD":
                 continue
-            if str(member.id) in tosses[channel]["tossed"]:
-                session = channel
-                break
-        return session
+            for uid in tosses[channel]["tossed"]:
+                tossed.setdefault(uid, channel)
+            for uid in tosses[channel].get("left", []):
+                if str(uid) in left and not left[str(uid)]:
+                    left[str(uid)] = channel
+        self.session_index[guild_id] = (tossed, left)
+        return tossed, left
+
+    def save_tosses(self, guild_id, tosses):
+        set_tossfile(guild_id, "tosses", json.dumps(tosses))
+        # Rebuilt from the new document on the next lookup.
+        self.session_index.pop(guild_id, None)
+
+    def get_session(self, member):
+        tossed, left = self.get_sessions(member.guild.id)
+        if str(member.id) in tossed:
+            return tossed[str(member.id)]
+        if str(member.id) in left:
+            return False
+        return None
 
     async def new_session(self, guild):
         staff_roles = [
@@ -101,7 +207,7 @@ class ModToss(Cog):
             if c not in [g.name for g in guild.channels]:
                 if c not in tosses:
                     tosses[c] = {"tossed": {}, "untossed": [], "left": []}
-                    set_tossfile(guild.id, "tosses", json.dumps(tosses))
+                    self.save_tosses(guild.id, tosses)
 
                 overwrites = {
                     guild.default_role: discord.PermissionOverwrite(
@@ -128,6 +234,9 @@ class ModToss(Cog):
                     overwrites=overwrites,
                     topic=get_config(guild.id, "toss", "tosstopic"),
                 )
+                session_path = self.session_path(toss_channel)
+                start_journal(session_path)
+                self.journals[toss_channel.id] = session_path
 
                 return toss_channel
 
@@ -139,22 +248,27 @@ class ModToss(Cog):
         if toss_role in user.roles:
             return False
 
-        roles = []
-        for rx in user.roles:
-            if rx != user.guild.default_role and rx != toss_role:
-                roles.append(rx)
+        roles = self.previous_roles(user, toss_role)
 
         tosses = get_tossfile(user.guild.id, "tosses")
         tosses[toss_channel.name]["tossed"][str(user.id)] = [role.id for role in roles]
-        set_tossfile(user.guild.id, "tosses", json.dumps(tosses))
+        self.save_tosses(user.guild.id, tosses)
+
+        return await self.apply_toss(user, staff, toss_role, roles)
+
+    def previous_roles(self, user, toss_role):
+        return [
+            rx for rx in user.roles if rx != user.guild.default_role and rx != toss_role
+        ]
 
+    async def apply_toss(self, user, staff, toss_role, roles):
+        """Swaps a user's roles for the toss role.
+
+        Returns the roles that couldn't be removed, and the ones that were."""
         await user.add_roles(toss_role, reason="User tossed.")
-        fail_roles = []
+        fail_roles = [rr for rr in roles if not rr.is_assignable()]
+        roles = [rr for rr in roles if rr.is_assignable()]
         if roles:
-            for rr in roles:
-                if not rr.is_assignable():
-                    fail_roles.append(rr)
-                    roles.remove(rr)
             await user.remove_roles(
                 *roles,
                 reason=f"User tossed by {staff} ({staff.id})",
@@ -163,6 +277,16 @@ class ModToss(Cog):
 
         return fail_roles, roles
 
+    async def undo_toss(self, user, toss_role, roles):
+        """Gives back what apply_toss may have taken, for a toss that failed partway."""
+        try:
+            await user.remove_roles(toss_role, reason="Toss failed.")
+            roles = [rr for rr in roles if rr.is_assignable()]
+            if roles:
+                await user.add_roles(*roles, reason="Toss failed.", atomic=False)
+        except discord.HTTPException:
+            pass
+
     @commands.bot_has_permissions(embed_links=True)
     @commands.check(ismod)
     @commands.guild_only()
@@ -254,7 +378,7 @@ class ModToss(Cog):
         )
 
         errors = ""
-        for us in users:
+        for us in list(users):
             if us.id == ctx.author.id:
                 errors += f"\n- {self.username_system(us)}\n  You cannot toss yourself."
             elif us.id == self.bot.application_id:
@@ -293,24 +417,60 @@ class ModToss(Cog):
             addition = False
             toss_channel = await self.new_session(ctx.guild)
 
+        # Everyone's toss state goes in one write, before any roles change.
+        previous = {us: self.previous_roles(us, toss_role) for us in users}
+        tosses = get_tossfile(ctx.guild.id, "tosses")
         for us in users:
-            try:
-                failed_roles, previous_roles = await self.perform_toss(
-                    us, ctx.author, toss_channel
-                )
-                await toss_channel.set_permissions(us, read_messages=True)
-            except commands.MissingPermissions:
-                errors += f"\n- {self.username_system(us)}\n  Missing permissions to toss this user."
-                continue
+            tosses[toss_channel.name]["tossed"][str(us.id)] = [
+                role.id for role in previous[us]
+            ]
+        self.save_tosses(ctx.guild.id, tosses)
+
+        # discord.py waits out rate limits by itself, this just keeps a raid's
+        # worth of role edits from all going out at once.
+        limit = asyncio.Semaphore(getattr(self.bot.config, "tossconcurrency", 5))
+
+        async def apply(us):
+            async with limit:
+                try:
+                    result = await self.apply_toss(
+                        us, ctx.author, toss_role, previous[us]
+                    )
+                    await toss_channel.set_permissions(us, read_messages=True)
+                    return result
+                except (commands.MissingPermissions, discord.HTTPException) as e:
+                    await self.undo_toss(us, toss_role, previous[us])
+                    return e
+
+        results = await asyncio.gather(*[apply(us) for us in users])
+        tossed = {
+            us: result
+            for us, result in zip(users, results)
+            if not isinstance(result, Exception)
+        }
+        if len(tossed) < len(users):
+            tosses = get_tossfile(ctx.guild.id, "tosses")
+            for us, result in zip(users, results):
+                if us in tossed:
+                    continue
+                if isinstance(result, (commands.MissingPermissions, discord.Forbidden)):
+                    errors += f"\n- {self.username_system(us)}\n  Missing permissions to toss this user."
+                else:
+                    errors += f"\n- {self.username_system(us)}\n  Discord failed to toss this user. ({result})"
+                del tosses[toss_channel.name]["tossed"][str(us.id)]
+            self.save_tosses(ctx.guild.id, tosses)
 
-            toss_userlog(
+        if tossed:
+            toss_userlogs(
                 ctx.guild.id,
-                us.id,
+                [us.id for us in tossed],
                 ctx.author,
                 ctx.message.jump_url,
                 toss_channel.id,
             )
 
+        if len(tossed) == 1:
+            [(us, (failed_roles, previous_roles))] = tossed.items()
             if notify_channel:
                 embed = stock_embed(self.bot)
                 author_embed(embed, us, True)
@@ -319,26 +479,15 @@ class ModToss(Cog):
                 embed.description = f"{us.mention} was tossed by {ctx.author.mention} [`#{ctx.channel.name}`] [[Jump]({ctx.message.jump_url})]\n> This toss takes place in {toss_channel.mention}..."
                 createdat_embed(embed, us)
                 joinedat_embed(embed, us)
-                prevlist = []
-                if len(previous_roles) > 0:
-                    for role in previous_roles:
-                        prevlist.append("<@&" + str(role.id) + ">")
-                    prevlist = ",".join(reversed(prevlist))
-                else:
-                    prevlist = "None"
                 embed.add_field(
                     name="🎨 Previous Roles",
-                    value=prevlist,
+                    value=self.role_list(previous_roles),
                     inline=False,
                 )
                 if failed_roles:
-                    faillist = []
-                    for role in failed_roles:
-                        faillist.append("<@&" + str(role.id) + ">")
-                    faillist = ",".join(reversed(faillist))
                     embed.add_field(
                         name="🚫 Failed Roles",
-                        value=faillist,
+                        value=self.role_list(failed_roles),
                         inline=False,
                     )
                 await notify_channel.send(embed=embed)
@@ -350,6 +499,20 @@ class ModToss(Cog):
                 embed.description = f"{us.mention} was tossed by {ctx.author.mention} [`#{ctx.channel.name}`] [[Jump]({ctx.message.jump_url})]"
                 mod_embed(embed, us, ctx.author)
                 await modlog_channel.send(embed=embed)
+        elif tossed:
+            if notify_channel:
+                for embed in self.batch_toss_embeds(ctx, toss_channel, tossed):
+                    await notify_channel.send(embed=embed)
+
+            if modlog_channel and modlog_channel != notify_channel:
+                embed = stock_embed(self.bot)
+                embed.color = discord.Color.from_str("#FF0000")
+                embed.title = f"🚷 Toss ({len(tossed)} users)"
+                embed.description = (
+                    f"{len(tossed)} users were tossed by {ctx.author.mention} [`#{ctx.channel.name}`] [[Jump]({ctx.message.jump_url})]\n"
+                    + "\n".join([f"- {us.mention} ({us.id})" for us in tossed])
+                )[:4096]
+                await modlog_channel.send(embed=embed)
 
         await ctx.message.add_reaction("🚷")
 
@@ -495,7 +658,7 @@ class ModToss(Cog):
                 )
                 await notify_channel.send(embed=embed)
 
-        set_tossfile(ctx.guild.id, "tosses", json.dumps(tosses))
+        self.save_tosses(ctx.guild.id, tosses)
         self.busy = False
 
         if invalid:
@@ -560,11 +723,6 @@ class ModToss(Cog):
         embed.set_author(name=ctx.author, icon_url=ctx.author.display_avatar.url)
 
         if archive:
-            async with ctx.channel.typing():
-                dotraw, dotzip = await log_channel(
-                    self.bot, ctx.channel, zip_files=True
-                )
-
             users = []
             for uid in (
                 tosses[ctx.channel.name]["untossed"] + tosses[ctx.channel.name]["left"]
@@ -585,71 +743,208 @@ class ModToss(Cog):
                 ctx.message.created_at.astimezone().strftime("%Y-%m-%d")
                 + f" {firstuser}"
             )
+            session_path = self.session_path(ctx.channel)
+            if not os.path.exists(session_path):
+                os.makedirs(session_path)
+
+            async with ctx.channel.typing():
+                if ctx.channel.id in self.journals:
+                    dotraw, dotzip = await finish_journal(
+                        self.bot,
+                        ctx.channel,
+                        f"{session_path}/{filename}",
+                        self.journals.pop(ctx.channel.id),
+                    )
+                else:
+                    # Sessions from before journaling, page the whole history.
+                    dotraw, dotzip = await log_channel(
+                        self.bot,
+                        ctx.channel,
+                        f"{session_path}/{filename}",
+                        zip_files=True,
+                    )
+
             reply = (
                 f"📕 I've archived that as: `{filename}.txt`\nThis mute session had the following users:\n- "
                 + "\n- ".join([f"{self.username_system(u)} ({u.id})" for u in users])
             )
-            dotraw += f"\n{ctx.message.created_at.astimezone().strftime('%Y/%m/%d %H:%M')} {self.bot.user} [BOT]\n{reply}"
+            footer = f"\n{ctx.message.created_at.astimezone().strftime('%Y/%m/%d %H:%M')} {self.bot.user} [BOT]\n{reply}"
 
-            if not os.path.exists(
-                f"data/servers/{ctx.guild.id}/toss/archives/sessions/{ctx.channel.id}"
-            ):
-                os.makedirs(
-                    f"data/servers/{ctx.guild.id}/toss/archives/sessions/{ctx.channel.id}"
+        elif ctx.channel.id in self.journals:
+            drop_journal(self.journals.pop(ctx.channel.id))
+
+        del tosses[ctx.channel.name]
+        self.save_tosses(ctx.guild.id, tosses)
+
+        channel = notify_channel if notify_channel else logging_channel
+        if archive:
+            # The history is all on disk now, the rest doesn't need the channel.
+            self.archiving[ctx.channel.id] = asyncio.create_task(
+                self.finish_archive(
+                    ctx, channel, embed, session_path, filename, footer, dotraw, dotzip
                 )
-            with open(
-                f"data/servers/{ctx.guild.id}/toss/archives/sessions/{ctx.channel.id}/{filename}.txt",
-                "w",
-                encoding="UTF-8",
-            ) as filetxt:
-                filetxt.write(dotraw)
-            if dotzip:
-                with open(
-                    f"data/servers/{ctx.guild.id}/toss/archives/sessions/{ctx.channel.id}/{filename} (files).zip",
-                    "wb",
-                ) as filezip:
-                    filezip.write(dotzip.getbuffer())
+            )
+        elif channel:
+            await channel.send(embed=embed)
+        if channel:
+            await ctx.channel.delete(reason="Fluff Mute")
+        return
+
+    async def finish_archive(
+        self, ctx, channel, embed, session_path, filename, footer, dotraw, dotzip
+    ):
+        """Counts and uploads a closed session's archive in the background.
 
+        The blocking parts run in the default executor, and progress is shown
+        by editing a message in `channel` until the embed replaces it."""
+        loop = asyncio.get_running_loop()
+        name = ctx.channel.name
+        progress = None
+        try:
+            if channel:
+                progress = await channel.send(f"📦 Archiving `#{name}`: Counting...")
+
+            lines, words, characters = await loop.run_in_executor(
+                None, finish_text, dotraw, footer
+            )
             embed.add_field(
                 name="🗒️ Text",
                 value=f"{filename}.txt\n"
-                + f"`"
-                + str(len(dotraw.split("\n")))
-                + "` lines, "
-                + f"`{len(dotraw.split())}` words, "
-                + f"`{len(dotraw)}` characters.",
+                + f"`{lines}` lines, "
+                + f"`{words}` words, "
+                + f"`{characters}` characters.",
                 inline=True,
             )
             if dotzip:
+                files = await loop.run_in_executor(None, count_zip, dotzip)
                 embed.add_field(
                     name="📁 Files",
                     value=f"{filename} (files).zip"
                     + "\n"
-                    + f"`{len(zipfile.ZipFile(dotzip, 'r', zipfile.ZIP_DEFLATED).namelist())}` files in the zip file.",
+                    + f"`{files}` files in the zip file.",
                     inline=True,
                 )
 
-            await upload(
-                ctx,
-                filename,
-                f"data/servers/{ctx.guild.id}/toss/archives/sessions/{ctx.channel.id}/",
-                dotzip,
+            await upload(ctx, filename, f"{session_path}/", dotzip)
+
+            if progress:
+                await progress.edit(content=None, embed=embed)
+        except:
+            if progress:
+                await progress.edit(
+                    content=f"⚠️ Archiving `#{name}` failed. The files are still in `{session_path}`."
+                )
+            await throw_error(self.bot, sys.exc_info(), "ModToss.finish_archive", 0)
+        finally:
+            del self.archiving[ctx.channel.id]
+
+    # Journaling
+
+    @Cog.listener()
+    async def on_ready(self):
+        # Anything from before a fresh gateway session is paged at close.
+        self.mark_gaps()
+
+    async def journal_stage(self, ctx):
+        message = ctx.message
+        if message.channel.id not in self.journals:
+            return
+        session_path = self.journals[message.channel.id]
+        append_journal(session_path, {"type": "message", **message_record(message)})
+        for a in message.attachments:
+            path = f"{journal_files_path(session_path)}/{a.id}-{a.filename}"
+            try:
+                await a.save(path)
+            except Exception:
+                # The message is fetched again at close and downloaded from there.
+                if os.path.exists(path):
+                    os.remove(path)
+                append_journal(session_path, {"type": "gap", "id": message.id})
+
+    @Cog.listener()
+    async def on_message_edit(self, before, after):
+        if after.channel.id not in self.journals:
+            return
+        record = message_record(after)
+        append_journal(
+            self.journals[after.channel.id],
+            {
+                "type": "edit",
+                **{k: record[k] for k in ("id", "edited", "content", "embeds")},
+            },
+        )
+
+    @Cog.listener()
+    async def on_raw_message_delete(self, payload):
+        if payload.channel_id in self.journals:
+            append_journal(
+                self.journals[payload.channel_id],
+                {"type": "delete", "id": payload.message_id},
             )
 
-        del tosses[ctx.channel.name]
-        set_tossfile(ctx.guild.id, "tosses", json.dumps(tosses))
+    @Cog.listener()
+    async def on_raw_bulk_message_delete(self, payload):
+        if payload.channel_id in self.journals:
+            for message_id in payload.message_ids:
+                append_journal(
+                    self.journals[payload.channel_id],
+                    {"type": "delete", "id": message_id},
+                )
 
-        channel = notify_channel if notify_channel else logging_channel
-        if channel:
-            await channel.send(embed=embed)
-            await ctx.channel.delete(reason="Fluff Mute")
-        return
+    @Cog.listener()
+    async def on_raw_reaction_add(self, payload):
+        if payload.channel_id in self.journals:
+            append_journal(
+                self.journals[payload.channel_id],
+                {
+                    "type": "reaction",
+                    "id": payload.message_id,
+                    "emoji": str(payload.emoji),
+                    "count": 1,
+                },
+            )
+
+    @Cog.listener()
+    async def on_raw_reaction_remove(self, payload):
+        if payload.channel_id in self.journals:
+            append_journal(
+                self.journals[payload.channel_id],
+                {
+                    "type": "reaction",
+                    "id": payload.message_id,
+                    "emoji": str(payload.emoji),
+                    "count": -1,
+                },
+            )
+
+    @Cog.listener()
+    async def on_raw_reaction_clear(self, payload):
+        if payload.channel_id in self.journals:
+            append_journal(
+                self.journals[payload.channel_id],
+                {"type": "clear", "id": payload.message_id},
+            )
+
+    @Cog.listener()
+    async def on_raw_reaction_clear_emoji(self, payload):
+        if payload.channel_id in self.journals:
+            append_journal(
+                self.journals[payload.channel_id],
+                {
+                    "type": "clear",
+                    "id": payload.message_id,
+                    "emoji": str(payload.emoji),
+                },
+            )
 
     @Cog.listener()
     async def on_member_join(self, member):
         await self.bot.wait_until_ready()
         if not self.enabled(member.guild):
             return
+        _, left = self.get_sessions(member.guild.id)
+        if str(member.id) not in left:
+            return
         notify_channel = self.bot.pull_channel(
             member.guild, get_config(member.guild.id, "toss", "notificationchannel")
         )
@@ -661,38 +956,33 @@ class ModToss(Cog):
         tosses = get_tossfile(member.guild.id, "tosses")
         toss_channel = None
 
-        if "LEFTGUILD" in tosses and str(member.id) in tosses["LEFTGUILD"]:
-            for channel in tosses:
-                if "left" in tosses[channel] and member.id in tosses[channel]["left"]:
-                    toss_channel = discord.utils.get(
-                        member.guild.channels, name=channel
-                    )
-                    break
-            if toss_channel:
-                toss_role = self.bot.pull_role(
-                    member.guild, get_config(member.guild.id, "toss", "tossrole")
-                )
-                await member.add_roles(toss_role, reason="User tossed.")
-                tosses[toss_channel.name]["tossed"][str(member.id)] = tosses[
-                    "LEFTGUILD"
-                ][str(member.id)]
-                tosses[toss_channel.name]["left"].remove(member.id)
-            else:
-                toss_channel = await self.new_session(member.guild)
-                failed_roles, previous_roles = await self.perform_toss(
-                    member, member.guild.me, toss_channel
-                )
-                tosses = get_tossfile(member.guild.id, "tosses")
-                tosses[toss_channel.name]["tossed"][str(member.id)] = tosses[
-                    "LEFTGUILD"
-                ][str(member.id)]
+        if left[str(member.id)]:
+            toss_channel = discord.utils.get(
+                member.guild.channels, name=left[str(member.id)]
+            )
+        if toss_channel:
+            toss_role = self.bot.pull_role(
+                member.guild, get_config(member.guild.id, "toss", "tossrole")
+            )
+            await member.add_roles(toss_role, reason="User tossed.")
+            tosses[toss_channel.name]["tossed"][str(member.id)] = tosses["LEFTGUILD"][
+                str(member.id)
+            ]
+            tosses[toss_channel.name]["left"].remove(member.id)
         else:
-            return
+            toss_channel = await self.new_session(member.guild)
+            failed_roles, previous_roles = await self.perform_toss(
+                member, member.guild.me, toss_channel
+            )
+            tosses = get_tossfile(member.guild.id, "tosses")
+            tosses[toss_channel.name]["tossed"][str(member.id)] = tosses["LEFTGUILD"][
+                str(member.id)
+            ]
 
         del tosses["LEFTGUILD"][str(member.id)]
         if not tosses["LEFTGUILD"]:
             del tosses["LEFTGUILD"]
-        set_tossfile(member.guild.id, "tosses", json.dumps(tosses))
+        self.save_tosses(member.guild.id, tosses)
 
         await toss_channel.set_permissions(member, read_messages=True)
         tossmsg = await toss_channel.send(
@@ -747,7 +1037,7 @@ class ModToss(Cog):
         tosses["LEFTGUILD"][str(member.id)] = tosses[session]["tossed"][str(member.id)]
         tosses[session]["left"].append(member.id)
         del tosses[session]["tossed"][str(member.id)]
-        set_tossfile(member.guild.id, "tosses", json.dumps(tosses))
+        self.save_tosses(member.guild.id, tosses)
 
         notify_channel = self.bot.pull_channel(
             member.guild, get_config(member.guild.id, "toss", "notificationchannel")
@@ -797,8 +1087,11 @@ class ModToss(Cog):
                 return
             await self.poketimers[str(channel.id)].cancel()
             del self.poketimers[str(channel.id)]
+            if channel.id in self.journals:
+                # Nothing left to archive it from, so it'd only be adopted again.
+                drop_journal(self.journals.pop(channel.id))
             del tosses[channel.name]
-            set_tossfile(channel.guild.id, "tosses", json.dumps(tosses))
+            self.save_tosses(channel.guild.id, tosses)
 
     @Cog.listener()
     async def on_autotoss_blocked(
@@ -1,10 +1,15 @@
 import discord, json, asyncio
+from collections import OrderedDict
 from discord.ext.commands import Cog
 from discord.ext import commands, tasks
 from helpers.datafiles import get_guildfile, set_guildfile
-from helpers.sv_config import get_config
-from helpers.datafiles import fill_profile, set_userfile
+from helpers.sv_config import get_config, get_section
+from helpers.datafiles import fill_profile, get_userfile, set_userfile, userfile_exists
+from helpers.datafiles import get_botfile, set_botfile
 from helpers.embeds import stock_embed, author_embed
+from helpers.counters import WindowCounter
+from helpers.pipeline import add_stage, remove_stage
+from helpers.prefixes import cache_user, cached_user
 
 
 class Reply(Cog):
@@ -14,31 +19,103 @@ class Reply(Cog):
 
     def __init__(self, bot):
         self.bot = bot
-        self.violations = {}
+        # (guild ID, user ID) to reply ping violation times in the window.
+        window = getattr(bot.config, "noreplywindow", 3600)
+        self.violations = WindowCounter(window, limit=32)
+        # (guild ID, user ID) to when their last incident was excused. Until
+        # that leaves the window, every incident is a violation.
+        self.excused = WindowCounter(window, limit=1)
+        saved = get_botfile("violations")
+        self.violations.restore(saved.get("noreply", []))
+        self.excused.restore(saved.get("noreply_excused", []))
         self.timers = {}
+        # User ID to reply preference, read from profiles the first time.
+        # Kept like the user prefixes, see helpers.prefixes.cache_user.
+        self.replyprefs = OrderedDict()
+        # Recent message IDs to (author ID, created timestamp), newest last,
+        # so replies to them don't need the message fetched.
+        self.recent = OrderedDict()
+        self.recent_size = 4096
         self.counttimer.start()
+        add_stage("noreply", self.noreply_stage)
 
     def cog_unload(self):
+        remove_stage("noreply")
         self.counttimer.cancel()
+        self.save_violations()
 
-    def check_override(self, message):
-        if not message.guild:
+    def save_violations(self):
+        if not self.violations.changed and not self.excused.changed:
+            return
+        violations = get_botfile("violations")
+        violations["noreply"] = self.violations.snapshot()
+        violations["noreply_excused"] = self.excused.snapshot()
+        set_botfile("violations", json.dumps(violations))
+
+    def check_override(self, member):
+        if not isinstance(member, discord.Member):
             return None
         setting_roles = [
-            (self.bot.pull_role(message.guild, "Please Ping"), "pleasereplyping"),
+            (self.bot.pull_role(member.guild, "Please Ping"), "pleasereplyping"),
             (
-                self.bot.pull_role(message.guild, "Ping after Delay"),
+                self.bot.pull_role(member.guild, "Ping after Delay"),
                 "waitbeforereplyping",
             ),
-            (self.bot.pull_role(message.guild, "No Ping"), "noreplyping"),
+            (self.bot.pull_role(member.guild, "No Ping"), "noreplyping"),
         ]
         for role, identifier in setting_roles:
             if role == None:
                 continue
-            elif role in message.author.roles:
+            elif role in member.roles:
                 return identifier
         return None
 
+    def get_replypref(self, uid):
+        if cached_user(self.replyprefs, uid):
+            return self.replyprefs[uid]
+        if userfile_exists(uid, "profile"):
+            return cache_user(
+                self.replyprefs, uid, get_userfile(uid, "profile").get("replypref")
+            )
+        return cache_user(self.replyprefs, uid, None)
+
+    def set_replypref(self, uid, preference):
+        cache_user(self.replyprefs, uid, preference)
+        profile = fill_profile(uid)
+        if profile["replypref"] != preference:
+            profile["replypref"] = preference
+            set_userfile(uid, "profile", json.dumps(profile))
+
+    def remember(self, message):
+        self.recent[message.id] = (
+            message.author.id,
+            int(message.created_at.timestamp()),
+        )
+        while len(self.recent) > self.recent_size:
+            self.recent.popitem(last=False)
+
+    async def resolve_reference(self, message):
+        """Returns (author ID, created timestamp) of the message replied to.
+
+        Checks what the gateway sent along, recently seen messages and the
+        bot's message cache before asking the API. The message cache is only
+        scanned for what the stage didn't see, like messages from bots."""
+        message_id = message.reference.message_id
+        refmessage = message.reference.resolved
+        if not isinstance(refmessage, discord.Message):
+            if message_id in self.recent:
+                return self.recent[message_id]
+            refmessage = discord.utils.get(
+                reversed(self.bot.cached_messages), id=message_id
+            )
+        if not refmessage:
+            try:
+                refmessage = await message.channel.fetch_message(message_id)
+            except discord.HTTPException:
+                return None
+        self.remember(refmessage)
+        return self.recent[message_id]
+
     async def add_violation(self, message):
         staff_roles = [
             self.bot.pull_role(
@@ -48,21 +125,14 @@ class Reply(Cog):
                 message.guild, get_config(message.guild.id, "staff", "adminrole")
             ),
         ]
-        if not get_config(message.guild.id, "reaction", "noreply_remind_every"):
+        reaction_config = get_section(message.guild.id, "reaction")
+        if not reaction_config["noreply_remind_every"]:
             return
-        noreply_remind = (
-            3
-            if get_config(message.guild.id, "reaction", "noreply_remind_every") > 3
-            else get_config(message.guild.id, "reaction", "noreply_remind_every")
-        )
+        noreply_remind = min(reaction_config["noreply_remind_every"], 3)
 
-        if not get_config(message.guild.id, "reaction", "noreply_threshold"):
+        if not reaction_config["noreply_threshold"]:
             return
-        noreply_thres = (
-            10
-            if get_config(message.guild.id, "reaction", "noreply_threshold") > 10
-            else get_config(message.guild.id, "reaction", "noreply_threshold")
-        )
+        noreply_thres = min(reaction_config["noreply_threshold"], 10)
         if (
             not any(staff_roles)
             or any([staff_role in message.author.roles for staff_role in staff_roles])
@@ -73,10 +143,9 @@ class Reply(Cog):
         message_author = message.author
         message_guild = message.guild
 
-        if message_guild.id not in self.violations:
-            self.violations[message_guild.id] = {}
-        if message_author.id not in self.violations[message.guild.id]:
-            self.violations[message_guild.id][message.author.id] = 0
+        key = (message_guild.id, message_author.id)
+        if key not in self.excused:
+            self.excused.add(key)
             acknowledgements = get_guildfile(message.guild.id, "acknowledgements")
             if str(message.author.id) not in acknowledgements:
                 temp_reminder_msg = await message_author.send(
@@ -105,8 +174,7 @@ class Reply(Cog):
                 message_guild.id, "acknowledgements", json.dumps(acknowledgements)
             )
 
-        self.violations[message.guild.id][message.author.id] += 1
-        violation_count = self.violations[message.guild.id][message.author.id]
+        violation_count = self.violations.add(key)
 
         modlog_channel = self.bot.pull_channel(
             message.guild, get_config(message.guild.id, "logging", "modlog")
@@ -118,9 +186,7 @@ class Reply(Cog):
             )
 
         try:
-            if self.violations[message.guild.id][message.author.id] == (
-                noreply_thres - 1
-            ):
+            if violation_count == noreply_thres - 1:
                 await notify_modlog(additional="Next violation will result in penalty.")
                 await message.reply(
                     content=f"# {message.author.mention}, your next violation will result in penalty.\n"
@@ -129,10 +195,7 @@ class Reply(Cog):
                     file=discord.File("assets/noreply.png"),
                 )
 
-            elif (
-                self.violations[message.guild.id][message.author.id] % noreply_remind
-                == 0
-            ):
+            elif violation_count % noreply_remind == 0:
                 await notify_modlog("Reminder sent.")
                 return await message.author.send(
                     content="**Do not reply ping users who do not wish to be pinged.**\n"
@@ -140,7 +203,7 @@ class Reply(Cog):
                     + f"{noreply_thres} violations will result in a penalty.",
                     file=discord.File("assets/noreply.png"),
                 )
-            elif self.violations[message.guild.id][message.author.id] >= noreply_thres:
+            elif violation_count >= noreply_thres:
                 return self.bot.dispatch(
                     "violation_threshold_reached", message, message.author
                 )
@@ -156,7 +219,7 @@ class Reply(Cog):
         See the [documentation](https://3gou.0ccu.lt/as-a-user/reply-ping-preferences/) for more info.
 
         No arguments."""
-        override = self.check_override(ctx.message)
+        override = self.check_override(ctx.author)
         if override:
             return await ctx.reply(
                 content="You already have an indicator role, you don't need to set your preferences here.",
@@ -248,6 +311,7 @@ class Reply(Cog):
                 role_name = "No Ping"
 
             set_userfile(ctx.author.id, "profile", json.dumps(profile))
+            cache_user(self.replyprefs, ctx.author.id, profile["replypref"])
             if role_name != None and ctx.guild:
                 role = self.bot.pull_role(ctx.guild, role_name)
                 if role:
@@ -259,52 +323,33 @@ class Reply(Cog):
                 await configmsg.remove_reaction(react, ctx.bot.user)
             await configmsg.edit(embed=embed, allowed_mentions=allowed_mentions)
 
-    @Cog.listener()
-    async def on_message(self, message):
-        await self.bot.wait_until_ready()
-
-        if (
-            message.author.bot
-            or message.is_system()
-            or not message.guild
-            or not message.reference
-            or message.type != discord.MessageType.reply
-        ):
+    async def noreply_stage(self, ctx):
+        message = ctx.message
+        self.remember(message)
+        if not message.reference or message.type != discord.MessageType.reply:
             return
 
-        try:
-            refmessage = await message.channel.fetch_message(
-                message.reference.message_id
-            )
-            if (
-                refmessage.author.id == message.author.id
-                or not message.guild.get_member(refmessage.author.id)
-            ):
-                return
-        except:
+        reference = await self.resolve_reference(message)
+        if not reference or reference[0] == message.author.id:
             return
-        preference = self.check_override(refmessage)
+        refauthor = message.guild.get_member(reference[0])
+        if not refauthor:
+            return
+        preference = self.check_override(refauthor)
         if not preference:
-            preference = fill_profile(refmessage.author.id)["replypref"]
+            preference = self.get_replypref(refauthor.id)
             if not preference:
                 return
 
         async def wrap_violation(message):
-            if not get_config(message.guild.id, "reaction", "noreply_remind_every"):
+            reaction_config = get_section(message.guild.id, "reaction")
+            if not reaction_config["noreply_remind_every"]:
                 return
-            noreply_remind = (
-                3
-                if get_config(message.guild.id, "reaction", "noreply_remind_every") > 3
-                else get_config(message.guild.id, "reaction", "noreply_remind_every")
-            )
+            noreply_remind = min(reaction_config["noreply_remind_every"], 3)
 
-            if not get_config(message.guild.id, "reaction", "noreply_threshold"):
+            if not reaction_config["noreply_threshold"]:
                 return
-            noreply_thres = (
-                10
-                if get_config(message.guild.id, "reaction", "noreply_threshold") > 10
-                else get_config(message.guild.id, "reaction", "noreply_threshold")
-            )
+            noreply_thres = min(reaction_config["noreply_threshold"], 10)
             try:
                 await self.add_violation(message)
                 return
@@ -319,10 +364,9 @@ class Reply(Cog):
                     ).moderate_members
                 ):
                     return
-                self.violations[message.guild.id][message.author.id] += 1
-                cur_violation_count = self.violations[message.guild.id][
-                    message.author.id
-                ]
+                cur_violation_count = self.violations.add(
+                    (message.guild.id, message.author.id)
+                )
                 if (
                     cur_violation_count > 1
                     and cur_violation_count % noreply_remind == 0
@@ -337,15 +381,12 @@ class Reply(Cog):
                         )
                     except discord.errors.NotFound:
                         return await message.reply(
-                            content=f"{message.author.mention} immediately deleted their own message.\n{message.author.display_name} now has `{self.violations[message.guild.id][message.author.id]}` violation(s).",
+                            content=f"{message.author.mention} immediately deleted their own message.\n{message.author.display_name} now has `{cur_violation_count}` violation(s).",
                             mention_author=True,
                         )
 
         # If not reply pinged...
-        if (
-            preference == "pleasereplyping"
-            and refmessage.author not in message.mentions
-        ):
+        if preference == "pleasereplyping" and refauthor not in message.mentions:
             try:
                 await message.add_reaction("<:pleaseping:1258418052651942053>")
             except discord.errors.NotFound:
@@ -354,13 +395,13 @@ class Reply(Cog):
                 if err.code == 90001:
                     pass
             pokemsg = await message.reply(
-                content=refmessage.author.mention, mention_author=False
+                content=refauthor.mention, mention_author=False
             )
-            await self.bot.await_message(message.channel, refmessage.author, 86400)
+            await self.bot.await_message(message.channel, refauthor, 86400)
             return await pokemsg.delete()
 
         # If reply pinged at all...
-        elif preference == "noreplyping" and refmessage.author in message.mentions:
+        elif preference == "noreplyping" and refauthor in message.mentions:
             try:
                 await message.add_reaction("<:noping:1258418038504689694>")
             except discord.errors.NotFound:
@@ -377,18 +418,13 @@ class Reply(Cog):
             return
 
         # If reply pinged in a window of time...
-        elif (
-            preference == "waitbeforereplyping"
-            and refmessage.author in message.mentions
-        ):
+        elif preference == "waitbeforereplyping" and refauthor in message.mentions:
             if message.guild.id not in self.timers:
                 self.timers[message.guild.id] = {}
-            self.timers[message.guild.id][refmessage.author.id] = int(
-                refmessage.created_at.timestamp()
-            )
+            self.timers[message.guild.id][refauthor.id] = reference[1]
             if (
                 int(message.created_at.timestamp()) - 30
-                <= self.timers[message.guild.id][refmessage.author.id]
+                <= self.timers[message.guild.id][refauthor.id]
             ):
                 try:
                     await message.add_reaction("<:waitbeforeping:1258418064781738076>")
@@ -405,10 +441,10 @@ class Reply(Cog):
                 await wrap_violation(message)
             return
 
-    @tasks.loop(hours=1)
+    @tasks.loop(minutes=5)
     async def counttimer(self):
         await self.bot.wait_until_ready()
-        self.violations = {}
+        self.save_violations()
 
     @Cog.listener()
     async def on_member_update(self, before, after):
@@ -421,13 +457,10 @@ class Reply(Cog):
         }
         for role in new_roles:
             if role.name in role_preferences:
-                profile = fill_profile(after.id)
-                profile["replypref"] = role_preferences[role.name]
-                set_userfile(after.id, "profile", json.dumps(profile))
-                return
-        profile = fill_profile(after.id)
-        profile["replypref"] = None
-        set_userfile(after.id, "profile", json.dumps(profile))
+                return self.set_replypref(after.id, role_preferences[role.name])
+        # Most member updates aren't about roles, only write when it changes.
+        if self.get_replypref(after.id) is not None:
+            self.set_replypref(after.id, None)
 
 
 async def setup(bot):
@@ -1,15 +1,17 @@
 import discord
 from discord.ext.commands import Cog
-from discord.ext import commands
 from helpers.sv_config import get_config
+from helpers.pipeline import add_stage, remove_stage, add_feature
 
 
 class NoSticker(Cog):
     def __init__(self, bot):
         self.bot = bot
+        add_feature("nosticker", lambda ctx: self.enabled(ctx.guild))
+        add_stage("nosticker", self.nosticker_stage, feature="nosticker")
 
-    def get_tenurerole(self, guild: discord.Guild):
-        return self.bot.pull_role(guild, get_config(guild.id, "tenure", "role"))
+    def cog_unload(self):
+        remove_stage("nosticker")
 
     def enabled(self, guild: discord.Guild):
         return all(
@@ -19,17 +21,9 @@ class NoSticker(Cog):
             )
         )
 
-    @commands.Cog.listener()
-    async def on_message(self, msg):
-        await self.bot.wait_until_ready()
-        if msg.author.bot or msg.is_system() or not msg.guild:
-            return
-
-        if not self.enabled(msg.guild):
-            return
-
-        tenure_role = self.get_tenurerole(msg.guild)
-        if tenure_role not in msg.author.roles and msg.stickers:
+    async def nosticker_stage(self, ctx):
+        msg = ctx.message
+        if msg.stickers and ctx.role("tenure", "role") not in msg.author.roles:
             return await msg.delete()
 
 
@@ -3,6 +3,7 @@ from discord.ext import commands
 from discord.ext.commands import Cog
 from helpers.datafiles import fill_profile, set_userfile
 from helpers.embeds import stock_embed, author_embed
+from helpers.prefixes import set_userprefixes, set_useraliases
 
 
 class Shortcuts(Cog):
@@ -58,6 +59,7 @@ class Shortcuts(Cog):
         if not len(profile["prefixes"]) >= maxprefixes:
             profile["prefixes"].append(f"{arg} ")
             set_userfile(ctx.author.id, "profile", json.dumps(profile))
+            set_userprefixes(ctx.author.id, profile["prefixes"])
             await ctx.reply(content="Prefix added.", mention_author=False)
         else:
             await ctx.reply(
@@ -77,6 +79,7 @@ class Shortcuts(Cog):
         try:
             profile["prefixes"].pop(number - 1)
             set_userfile(ctx.author.id, "profile", json.dumps(profile))
+            set_userprefixes(ctx.author.id, profile["prefixes"])
             await ctx.reply(content="Prefix removed.", mention_author=False)
         except IndexError:
             await ctx.reply(content="This prefix does not exist.", mention_author=False)
@@ -150,6 +153,7 @@ class Shortcuts(Cog):
 
         profile["aliases"].append({botcommand.qualified_name: alias})
         set_userfile(ctx.author.id, "profile", json.dumps(profile))
+        set_useraliases(ctx.author.id, profile["aliases"])
         return await ctx.reply(content="Alias added.", mention_author=False)
 
     @aliases.command(name="remove")
@@ -164,6 +168,7 @@ class Shortcuts(Cog):
         try:
             profile["aliases"].pop(number - 1)
             set_userfile(ctx.author.id, "profile", json.dumps(profile))
+            set_useraliases(ctx.author.id, profile["aliases"])
             await ctx.reply(content="Alias removed.", mention_author=False)
         except IndexError:
             await ctx.reply(content="This alias does not exist.", mention_author=False)
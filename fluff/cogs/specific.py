@@ -2,11 +2,16 @@ from discord.ext import commands
 from discord.ext.commands import Cog
 from helpers.sv_config import get_config
 from helpers.embeds import stock_embed
+from helpers.pipeline import add_stage, remove_stage
 
 
 class specific(Cog):
     def __init__(self, bot):
         self.bot = bot
+        add_stage("specific", self.specific_stage, users_only=False)
+
+    def cog_unload(self):
+        remove_stage("specific")
 
     @commands.bot_has_permissions(embed_links=True)
     @commands.guild_only()
@@ -88,10 +93,8 @@ class specific(Cog):
             )
         await ctx.reply(embed=embed, mention_author=False)
 
-    @Cog.listener()
-    async def on_message(self, message):
-        await self.bot.wait_until_ready()
-
+    async def specific_stage(self, ctx):
+        message = ctx.message
         # announcement handling
         if (
             message.guild
@@ -5,11 +5,17 @@ from helpers.placeholders import random_msg
 from helpers.datafiles import get_guildfile, set_guildfile
 from helpers.checks import ismod, ismanager
 from helpers.embeds import stock_embed, sympage
+from helpers.pipeline import add_stage, remove_stage
 
 
 class StickiedPins(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        # Pin notices are system messages.
+        add_stage("stickiedpins", self.stickiedpins_stage, users_only=False)
+
+    def cog_unload(self):
+        remove_stage("stickiedpins")
 
     async def update_pins(
         self, guild: discord.Guild, channel: discord.abc.GuildChannel
@@ -86,9 +92,8 @@ class StickiedPins(commands.Cog):
         channel = target_channel or ctx.channel
         return await self.update_pins(guild, channel)
 
-    @commands.Cog.listener()
-    async def on_message(self, message: discord.Message):
-
+    async def stickiedpins_stage(self, ctx):
+        message = ctx.message
         if all(
             [
                 message.guild != None,
@@ -1,16 +1,51 @@
+import json
+import time
+import heapq
+import asyncio
+import traceback
 import discord
 from discord.ext.commands import Cog
-from discord.ext import commands
+from discord.ext import commands, tasks
 from helpers.sv_config import get_config
+from helpers.datafiles import get_botfile, set_botfile
+from helpers.pipeline import add_stage, remove_stage, add_feature
 from helpers.checks import ismanager, isadmin
 from datetime import datetime, timedelta, UTC
 from config import logchannel
 
+# force_sync saves its progress after every this many members.
+sync_batch = 50
+
 
 class Tenure(Cog):
     def __init__(self, bot):
         self.bot = bot
         self.nocfgmsg = "Tenure isn't configured for this server.."
+        # Indexed guilds were enabled when indexed, and are checked again by
+        # the scheduler, so their messages skip the config lookups.
+        add_feature(
+            "tenure",
+            lambda ctx: ctx.guild.id in self.thresholds or self.enabled(ctx.guild),
+        )
+        add_stage("tenure", self.tenure_stage, feature="tenure")
+        # (guild ID, member ID) of members with the role or the disabled role,
+        # and of members waiting in the schedule. Their messages need nothing.
+        self.tracked = set()
+        # (eligible timestamp, guild ID, member ID), soonest first.
+        self.schedule = []
+        # (guild ID, member ID) to the timestamp they're scheduled for. Entries
+        # in the schedule that don't match are stale and get skipped.
+        self.deadlines = {}
+        # Indexed guilds to the threshold they were indexed with.
+        self.thresholds = {}
+        self.wakeup = asyncio.Event()
+        # Guild IDs with a force_sync running.
+        self.syncing = set()
+        self.scheduler.start()
+
+    def cog_unload(self):
+        remove_stage("tenure")
+        self.scheduler.cancel()
 
     async def check_joindelta(self, member: discord.Member):
         return datetime.now(UTC) - member.joined_at
@@ -38,6 +73,133 @@ class Tenure(Cog):
         except KeyError:
             return False
 
+    # Schedule
+
+    def track(self, member, tenure_config):
+        """Tracks a member who has nothing to wait for or is still waiting.
+
+        Returns False for members already past the threshold without the role."""
+        key = (member.guild.id, member.id)
+        if (
+            tenure_config["role_disabled"] in member.roles
+            or tenure_config["role"] in member.roles
+        ):
+            self.tracked.add(key)
+            return True
+        if not member.joined_at:
+            return False
+        # Matches `threshold < days`, the role comes a day after the threshold.
+        eligible = member.joined_at + timedelta(days=tenure_config["threshold"] + 1)
+        if eligible <= datetime.now(UTC):
+            return False
+        self.tracked.add(key)
+        if self.deadlines.get(key) == eligible.timestamp():
+            return True
+        self.deadlines[key] = eligible.timestamp()
+        heapq.heappush(self.schedule, (eligible.timestamp(), *key))
+        if self.schedule[0][1:] == key:
+            self.wakeup.set()
+        return True
+
+    def forget_guild(self, guild_id):
+        self.tracked = {key for key in self.tracked if key[0] != guild_id}
+        self.deadlines = {
+            key: ts for key, ts in self.deadlines.items() if key[0] != guild_id
+        }
+        self.schedule = [entry for entry in self.schedule if entry[1] != guild_id]
+        heapq.heapify(self.schedule)
+        self.thresholds.pop(guild_id, None)
+
+    def index_guild(self, guild):
+        self.forget_guild(guild.id)
+        if not self.enabled(guild):
+            return
+        tenure_config = self.get_tenureconfig(guild)
+        self.thresholds[guild.id] = tenure_config["threshold"]
+        # Members already past the threshold are left to their next message,
+        # or to force_sync, rather than all getting the role at once.
+        for member in guild.members:
+            self.track(member, tenure_config)
+
+    async def grant_due(self):
+        now = time.time()
+        configs = {}
+        while self.schedule and self.schedule[0][0] <= now:
+            eligible, guild_id, member_id = heapq.heappop(self.schedule)
+            if self.deadlines.get((guild_id, member_id)) != eligible:
+                continue
+            del self.deadlines[(guild_id, member_id)]
+            self.tracked.discard((guild_id, member_id))
+            guild = self.bot.get_guild(guild_id)
+            member = guild and guild.get_member(member_id)
+            if not member or guild_id not in self.thresholds:
+                continue
+            if guild_id not in configs:
+                configs[guild_id] = self.get_tenureconfig(guild)
+            if self.track(member, configs[guild_id]):
+                continue
+            try:
+                await member.add_roles(
+                    configs[guild_id]["role"],
+                    reason="Fluff Tenure (Automatic assignment)",
+                )
+            except discord.HTTPException:
+                # Left for their next message to try again.
+                continue
+            self.tracked.add((guild_id, member_id))
+
+    def check_thresholds(self):
+        for guild_id, threshold in list(self.thresholds.items()):
+            guild = self.bot.get_guild(guild_id)
+            if not guild:
+                self.forget_guild(guild_id)
+            elif (
+                not self.enabled(guild)
+                or get_config(guild_id, "tenure", "threshold") != threshold
+            ):
+                self.index_guild(guild)
+
+    @tasks.loop()
+    async def scheduler(self):
+        await self.bot.wait_until_ready()
+        try:
+            self.wakeup.clear()
+            # Configs have no change hook, so they're checked at least hourly.
+            timeout = self.schedule[0][0] - time.time() if self.schedule else 3600
+            if timeout > 0:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), min(timeout, 3600))
+                except asyncio.TimeoutError:
+                    pass
+            self.check_thresholds()
+            await self.grant_due()
+        except:
+            await self.bot.get_channel(logchannel).send(
+                f"Tenure scheduler has errored: ```{traceback.format_exc()}```"
+            )
+
+    @Cog.listener()
+    async def on_member_join(self, member):
+        if member.guild.id in self.thresholds:
+            self.track(member, self.get_tenureconfig(member.guild))
+
+    @Cog.listener()
+    async def on_member_remove(self, member):
+        self.tracked.discard((member.guild.id, member.id))
+
+    @Cog.listener()
+    async def on_member_update(self, before, after):
+        if before.roles == after.roles or after.guild.id not in self.thresholds:
+            return
+        self.tracked.discard((after.guild.id, after.id))
+        self.track(after, self.get_tenureconfig(after.guild))
+
+    @Cog.listener()
+    async def on_guild_remove(self, guild):
+        self.forget_guild(guild.id)
+
+    # Commands
+
     @commands.guild_only()
     @commands.cooldown(1, 5, commands.BucketType.guild)
     @commands.group(invoke_without_command=True)
@@ -112,32 +274,95 @@ class Tenure(Cog):
     @commands.check(ismanager)
     @tenure.command()
     async def force_sync(self, ctx):
-        """THIS WILL FORCEFULLY SYNCHRONIZE THE SERVER MEMBERS WITH THE TENURE ROLE.
+        """This gives the tenure role to every eligible member missing it.
 
-        THIS IS VERY TIME CONSUMING.
+        Progress is saved as it goes, so running it again after a
+        restart picks up where the last run left off.
 
-        RUN ONCE, NEVER AGAIN.
-        """
+        No arguments."""
         if not self.enabled(ctx.guild):
             return await ctx.reply(self.nocfgmsg, mention_author=False)
+        if ctx.guild.id in self.syncing:
+            return await ctx.reply(
+                "A sync is already running for this server.", mention_author=False
+            )
+        self.syncing.add(ctx.guild.id)
+        try:
+            await self.sync_roles(ctx)
+        finally:
+            self.syncing.discard(ctx.guild.id)
+
+    async def sync_roles(self, ctx):
         tenure_config = self.get_tenureconfig(ctx.guild)
-        tenure_threshold = tenure_config["threshold"]
         tenure_role = tenure_config["role"]
+        syncs = get_botfile("tenuresync")
+        progress = syncs.get(str(ctx.guild.id)) or {
+            "started": int(time.time()),
+            "last_id": 0,
+            "done": 0,
+            "failed": 0,
+        }
+        resumed = progress["last_id"] != 0
+
+        # Members go in ID order, so everything up to last_id is done.
+        now = datetime.now(UTC)
+        missing = sorted(
+            (
+                member
+                for member in ctx.guild.members
+                if member.id > progress["last_id"]
+                and member.joined_at
+                and tenure_role not in member.roles
+                and tenure_config["role_disabled"] not in member.roles
+                and tenure_config["threshold"] < (now - member.joined_at).days
+            ),
+            key=lambda member: member.id,
+        )
+        total = progress["done"] + progress["failed"] + len(missing)
+
+        status = await ctx.reply(
+            f"{'Resuming' if resumed else 'Starting'} a sync of `{len(missing)}` members missing {tenure_role.name}..",
+            mention_author=False,
+        )
+        # discord.py waits out rate limits on its own, this only keeps
+        # the queue for the guild's member routes from growing without end.
+        limit = asyncio.Semaphore(getattr(self.bot.config, "tenureconcurrency", 5))
+
+        async def grant(member):
+            async with limit:
+                try:
+                    await member.add_roles(tenure_role, reason="Fluff Tenure (Sync)")
+                except discord.HTTPException:
+                    return False
+                self.tracked.add((ctx.guild.id, member.id))
+                return True
+
+        started = time.time()
+        last_status = started
+        for i in range(0, len(missing), sync_batch):
+            batch = missing[i : i + sync_batch]
+            results = await asyncio.gather(*[grant(member) for member in batch])
+            progress["done"] += results.count(True)
+            progress["failed"] += results.count(False)
+            progress["last_id"] = batch[-1].id
+            syncs[str(ctx.guild.id)] = progress
+            set_botfile("tenuresync", json.dumps(syncs))
+
+            if time.time() - last_status >= 10:
+                last_status = time.time()
+                rate = (i + len(batch)) / (last_status - started)
+                remaining = len(missing) - i - len(batch)
+                await status.edit(
+                    content=f"Synced `{progress['done'] + progress['failed']}/{total}` members, `{progress['failed']}` failed.\n"
+                    + f"Going at `{rate:.1f}` members per second, done <t:{int(last_status + remaining / rate)}:R>."
+                )
 
-        await ctx.reply("Oh boy..", mention_author=False)
-
-        for member in ctx.guild.members:
-            tenure_dt = await self.check_joindelta(member)
-            tenure_days = tenure_dt.days
-            print(f"{member.global_name} ({member.id}) joined {tenure_days} days ago")
-            if tenure_threshold < tenure_days:
-                if tenure_role not in member.roles:
-                    print(
-                        f"Assigning {tenure_role.name} to {member.global_name}, as they have enough tenure"
-                    )
-                    await member.add_roles(tenure_role, reason="Fluff Tenure")
-                else:
-                    return
+        syncs.pop(str(ctx.guild.id), None)
+        set_botfile("tenuresync", json.dumps(syncs))
+        await status.edit(
+            content=f"Sync done! Gave {tenure_role.name} to `{progress['done']}` members, `{progress['failed']}` failed. "
+            + f"It was started <t:{progress['started']}:R>."
+        )
 
     @commands.check(isadmin)
     @tenure.command(aliases=["blacklist", "bl"])
@@ -189,16 +414,21 @@ class Tenure(Cog):
                 content=f"{user.mention} is not prohibited from receiving the {tenure_role.mention} role. No operations have been performed.",
             )
 
-    @Cog.listener()
-    async def on_message(self, msg):
-        await self.bot.wait_until_ready()
-        if msg.author.bot or msg.is_system() or not msg.guild:
+    async def tenure_stage(self, ctx):
+        msg = ctx.message
+        key = (msg.guild.id, msg.author.id)
+        if key in self.tracked:
             return
-
-        if not self.enabled(msg.guild):
-            return
-
-        tenureconfig = self.get_tenureconfig(msg.guild)
+        if msg.guild.id not in self.thresholds:
+            self.index_guild(msg.guild)
+            if key in self.tracked:
+                return
+
+        tenureconfig = {
+            "role_disabled": ctx.role("tenure", "role_disabled"),
+            "role": ctx.role("tenure", "role"),
+            "threshold": ctx.config("tenure", "threshold"),
+        }
         tenure_dt = await self.check_joindelta(msg.author)
         tenure_days = tenure_dt.days
 
@@ -209,15 +439,14 @@ class Tenure(Cog):
         #         set_guildfile(msg.guild.id, "tenure_disabled", json.dumps(tenureconfig["disabled_users"]))
         #     return await msg.author.remove_roles(tenureconfig["role"], reason="Fluff Tenure (Prohibition enforcement)")
 
-        if tenureconfig["role_disabled"] in msg.author.roles:
+        if self.track(msg.author, tenureconfig):
             return
-        elif (
-            tenureconfig["role"] not in msg.author.roles
-            and tenureconfig["threshold"] < tenure_days
-        ):
-            return await msg.author.add_roles(
+        elif tenureconfig["threshold"] < tenure_days:
+            await msg.author.add_roles(
                 tenureconfig["role"], reason="Fluff Tenure (Automatic assignment)"
             )
+            # The member cache may not show the role until the update comes in.
+            self.tracked.add(key)
 
 
 async def setup(bot: discord.Client):
@@ -1,4 +1,6 @@
 import time
+import heapq
+import asyncio
 import discord
 import traceback
 import random
@@ -7,23 +9,51 @@ import os
 from datetime import datetime
 from discord.ext import commands, tasks
 from discord.ext.commands import Cog
-from helpers.datafiles import get_botfile, delete_job
+from helpers.datafiles import (
+    get_botfile,
+    delete_job,
+    delete_jobs,
+    flush_files,
+    job_hooks,
+)
 from helpers.checks import ismanager
-from helpers.placeholders import game_type, game_names
+from helpers.placeholders import game_type, get_placeholders
 
 
 class Timer(Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.minutely.start()
+        self.jobs = []
+        self.wakeup = asyncio.Event()
+        self.last_run = None
+        self.load_jobs()
+        job_hooks.append(self.schedule_job)
+        self.scheduler.start()
         self.hourly.start()
         self.daily.start()
 
     def cog_unload(self):
-        self.minutely.cancel()
+        job_hooks.remove(self.schedule_job)
+        self.scheduler.cancel()
         self.hourly.cancel()
         self.daily.cancel()
 
+    def load_jobs(self):
+        """Rebuilds the job heap from the timers file."""
+        ctab = get_botfile("timers")
+        self.jobs = [
+            (int(jobtimestamp), jobtype, jobtimestamp)
+            for jobtype in ctab
+            for jobtimestamp in ctab[jobtype]
+        ]
+        heapq.heapify(self.jobs)
+        self.wakeup.set()
+
+    def schedule_job(self, jobtype, jobtimestamp, job_name):
+        heapq.heappush(self.jobs, (int(jobtimestamp), jobtype, jobtimestamp))
+        if self.jobs[0][2] == jobtimestamp:
+            self.wakeup.set()
+
     @commands.check(ismanager)
     @commands.command()
     async def listjobs(self, ctx):
@@ -34,6 +64,12 @@ class Timer(Cog):
         No arguments."""
         ctab = get_botfile("timers")
         embed = discord.Embed(title=f"Active jobs")
+        if self.last_run:
+            embed.description = (
+                f"Last run <t:{self.last_run['started']}:R>: "
+                + f"`{self.last_run['jobs']}` jobs, `{self.last_run['failures']}` failed, "
+                + f"took `{self.last_run['duration']:.1f}s`, up to `{self.last_run['lateness']:.1f}s` late."
+            )
         for jobtype in ctab:
             for jobtimestamp in ctab[jobtype]:
                 for job_name in ctab[jobtype][jobtimestamp]:
@@ -61,59 +97,101 @@ class Timer(Cog):
         delete_job(timestamp, job_type, job_name)
         await ctx.send(f"{ctx.author.mention}: Deleted!")
 
-    async def do_jobs(self, ctab, jobtype, timestamp):
-        log_channel = self.bot.get_channel(self.bot.config.logchannel)
-        for job_name in ctab[jobtype][timestamp]:
-            try:
-                job_details = ctab[jobtype][timestamp][job_name]
-                if jobtype == "unban":
-                    target_user = await self.bot.fetch_user(job_name)
-                    target_guild = self.bot.get_guild(job_details["guild"])
-                    delete_job(timestamp, jobtype, job_name)
-                    await target_guild.unban(target_user, reason="Timed ban expired.")
-                elif jobtype == "remind":
-                    text = job_details["text"]
-                    original_timestamp = job_details["added"]
-                    target = await self.bot.fetch_user(int(job_name))
-                    if target:
-                        embed = discord.Embed(
-                            title="⏰ Reminder",
-                            description=f"You asked to be reminded <t:{original_timestamp}:R> on <t:{original_timestamp}:f>.",
-                            timestamp=datetime.now(),
-                        )
-                        embed.set_footer(
-                            text=self.bot.user.name, icon_url=self.bot.user.avatar.url
-                        )
-                        embed.add_field(
-                            name="📝 Contents",
-                            value=f"{text}",
-                            inline=False,
-                        )
-                        await target.send(embed=embed)
-                    delete_job(timestamp, jobtype, job_name)
-            except:
-                # Don't kill cronjobs if something goes wrong.
-                delete_job(timestamp, jobtype, job_name)
-                await log_channel.send(
-                    "Crondo has errored, job deleted: ```"
-                    f"{traceback.format_exc()}```"
+    async def do_job(self, jobtype, job_name, job_details):
+        if jobtype == "unban":
+            target_guild = self.bot.get_guild(job_details["guild"])
+            await target_guild.unban(
+                discord.Object(int(job_name)), reason="Timed ban expired."
+            )
+        elif jobtype == "remind":
+            text = job_details["text"]
+            original_timestamp = job_details["added"]
+            target = self.bot.get_user(int(job_name)) or await self.bot.fetch_user(
+                int(job_name)
+            )
+            if target:
+                embed = discord.Embed(
+                    title="⏰ Reminder",
+                    description=f"You asked to be reminded <t:{original_timestamp}:R> on <t:{original_timestamp}:f>.",
+                    timestamp=datetime.now(),
+                )
+                embed.set_footer(
+                    text=self.bot.user.name, icon_url=self.bot.user.avatar.url
                 )
+                embed.add_field(
+                    name="📝 Contents",
+                    value=f"{text}",
+                    inline=False,
+                )
+                await target.send(embed=embed)
 
-    @tasks.loop(minutes=1)
-    async def minutely(self):
+    async def do_jobs(self, ctab, due):
+        log_channel = self.bot.get_channel(self.bot.config.logchannel)
+        # discord.py queues requests on the same rate limit bucket by itself,
+        # this just keeps a big batch from flooding it all at once.
+        limit = asyncio.Semaphore(getattr(self.bot.config, "jobconcurrency", 5))
+        jobs = [
+            (jobtype, timestamp, job_name, ctab[jobtype][timestamp][job_name])
+            for jobtype, timestamp in due
+            for job_name in ctab[jobtype][timestamp]
+        ]
+        errors = []
+        started = time.time()
+
+        async def run(jobtype, timestamp, job_name, job_details):
+            async with limit:
+                try:
+                    await self.do_job(jobtype, job_name, job_details)
+                except:
+                    errors.append(traceback.format_exc())
+
+        await asyncio.gather(*[run(*job) for job in jobs])
+        # Failed jobs get deleted too. Don't kill cronjobs if something goes wrong.
+        delete_jobs(
+            [(timestamp, jobtype, job_name) for jobtype, timestamp, job_name, _ in jobs]
+        )
+
+        self.last_run = {
+            "started": int(started),
+            "jobs": len(jobs),
+            "failures": len(errors),
+            "duration": time.time() - started,
+            "lateness": started - min(int(timestamp) for _, timestamp in due),
+        }
+        for error in errors:
+            await log_channel.send(f"Crondo has errored, job deleted: ```{error}```")
+
+    async def wait_for_jobs(self):
+        self.wakeup.clear()
+        timeout = self.jobs[0][0] - time.time() if self.jobs else None
+        if timeout is not None and timeout <= 0:
+            return
+        try:
+            await asyncio.wait_for(self.wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    @tasks.loop()
+    async def scheduler(self):
         await self.bot.wait_until_ready()
         log_channel = self.bot.get_channel(self.bot.config.logchannel)
         try:
-            ctab = get_botfile("timers")
+            await self.wait_for_jobs()
             timestamp = time.time()
-            for jobtype in ctab:
-                for jobtimestamp in ctab[jobtype]:
-                    if timestamp > int(jobtimestamp):
-                        await self.do_jobs(ctab, jobtype, jobtimestamp)
+            due = []
+            while self.jobs and self.jobs[0][0] <= timestamp:
+                _, jobtype, jobtimestamp = heapq.heappop(self.jobs)
+                if (jobtype, jobtimestamp) not in due:
+                    due.append((jobtype, jobtimestamp))
+            # Entries stay in the heap when jobs are deleted by hand.
+            ctab = get_botfile("timers")
+            due = [(jt, ts) for jt, ts in due if jt in ctab and ts in ctab[jt]]
+            if due:
+                await self.do_jobs(ctab, due)
         except:
             # Don't kill cronjobs if something goes wrong.
             await log_channel.send(
-                f"Cron-minutely has errored: ```{traceback.format_exc()}```"
+                f"Cron-scheduler has errored: ```{traceback.format_exc()}```"
             )
 
     @tasks.loop(hours=1)
@@ -122,7 +200,9 @@ class Timer(Cog):
         log_channel = self.bot.get_channel(self.bot.config.logchannel)
         try:
             # Change playing status.
-            activity = discord.Activity(name=random.choice(game_names), type=game_type)
+            activity = discord.Activity(
+                name=random.choice(get_placeholders()["games"]), type=game_type
+            )
             await self.bot.change_presence(activity=activity)
         except:
             # Don't kill cronjobs if something goes wrong.
@@ -135,6 +215,7 @@ class Timer(Cog):
         await self.bot.wait_until_ready()
         log_channel = self.bot.get_channel(self.bot.config.logchannel)
         try:
+            flush_files()
             shutil.make_archive("data_backup", "zip", "data")
             for m in self.bot.config.managers:
                 await self.bot.get_user(m).send(
@@ -19,6 +19,18 @@ long_desc = (
     + "Built and coded by [renavi](https://0ccu.lt), forked from [robocop-ng](https://github.com/reswitched/robocop-ng)."
 )
 
+# [helpers.datafiles] Where userlogs, timers, tosses and profiles are kept.
+# "json" keeps them as files in the data folder, "sqlite" keeps them in data/fluff.db.
+# After switching to "sqlite", run `pls migratedata` once to import the old files.
+storage = "json"
+# [cogs.timer] How many timed jobs (unbans, reminders) may run at once.
+jobconcurrency = 5
+# [cogs.mod_toss] How many users may have their roles swapped at once when tossing several.
+tossconcurrency = 5
+# [cogs.tenure] How many members force_sync may give the tenure role to at once.
+tenureconcurrency = 5
+# [cogs.noreply] How many seconds reply ping violations count towards the threshold for.
+noreplywindow = 3600
 # [cogs.shortcuts/prefixes] Maximum prefixes allowed.
 # This setting will cap at 25 prefixes regardless.
 maxprefixes = 6
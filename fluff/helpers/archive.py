@@ -1,103 +1,331 @@
 # This Helper contains code from Archiver, which was made by Roadcrosser.
 # 🖤 If by any chance you're reading, we all miss you.
 # https://github.com/Roadcrosser/archiver
+import os
+import json
+import shutil
+import asyncio
 import discord
 import textwrap
 import zipfile
-from io import BytesIO
+import functools
+from datetime import datetime
+from collections import deque
 
+# Attachments are downloaded alongside the history, up to this many at once
+# and this many bytes held in memory before they're written to the zip.
+download_concurrency = 4
+download_bytes = 64 * 1024 * 1024
 
-async def log_channel(bot, channel, zip_files=False, start_ts=None, end_ts=None):
-    st = ""
 
-    if zip_files:
-        b = BytesIO()
-        z = zipfile.ZipFile(b, "w", zipfile.ZIP_DEFLATED)
-        zipped_count = 0
+async def download(bot, url):
+    async with bot.session.get(url) as r:
+        r.raise_for_status()
+        return await r.read()
 
+
+async def local_file(path):
+    return path
+
+
+def message_record(m):
+    """Everything an archive needs from a message, as plain JSON data."""
+    if m.type == discord.MessageType.reply:
+        rep = m.reference.resolved
+        if isinstance(rep, discord.DeletedReferencedMessage):
+            preheader = "Original message was deleted"
+        elif not rep:
+            preheader = "Message could not be loaded"
+        else:
+            preheader = (
+                "↗️ "
+                + ("[BOT] " if rep.author.bot else "")
+                + ("@" if rep.author in m.mentions else "")
+                + rep.author.name
+                + " "
+                + rep.clean_content[:50]
+                + ("..." if len(rep.clean_content) > 50 else "")
+                + "\n"
+            )
+    else:
+        preheader = ""
+    return {
+        "id": m.id,
+        "author": m.author.name,
+        "bot": m.author.bot,
+        "created": m.created_at.timestamp(),
+        "edited": m.edited_at.timestamp() if m.edited_at else None,
+        "reply": preheader,
+        "content": m.system_content if m.is_system() else m.clean_content,
+        "attachments": [
+            {"id": a.id, "filename": a.filename, "url": a.url, "size": a.size}
+            for a in m.attachments
+        ],
+        "embeds": [e.to_dict() for e in m.embeds if e.type == "rich"],
+        "reactions": {str(rea.emoji): rea.count for rea in m.reactions},
+    }
+
+
+def textify_record(r, zip_files):
+    blank_content = True
+    text = (
+        r["reply"]
+        + r["author"]
+        + (" [BOT] " if r["bot"] else " ")
+        + datetime.fromtimestamp(r["created"]).strftime("%Y/%m/%d %H:%M")
+        + (
+            " (edited "
+            + datetime.fromtimestamp(r["edited"]).strftime("%Y/%m/%d %H:%M")
+            + ")"
+            if r["edited"]
+            else ""
+        )
+        + "\n"
+    )
+    text += r["content"]
+    if r["content"]:
+        blank_content = False
+
+    for a in r["attachments"]:
+        if not blank_content:
+            text += "\n"
+        text += textify_attach(
+            (a["filename"], f"{a['id']}-{a['filename']}" if zip_files else None)
+        )
+        blank_content = False
+
+    for e in r["embeds"]:
+        if not blank_content:
+            text += "\n"
+        text += textify_embed(discord.Embed.from_dict(e))
+        blank_content = False
+
+    if r["reactions"]:
+        if not blank_content:
+            text += "\n"
+        text += " ".join(
+            [f"[ {emoji} {count} ]" for emoji, count in r["reactions"].items()]
+        )
+
+    return text + "\n\n"
+
+
+async def history_records(channel, start_ts=None, end_ts=None):
     async for m in channel.history(
         limit=None, before=end_ts, after=start_ts, oldest_first=True
     ):
-        blank_content = True
+        yield message_record(m)
 
-        header = (
-            m.author.name
-            + (" [BOT] " if m.author.bot else " ")
-            + m.created_at.astimezone().strftime("%Y/%m/%d %H:%M")
-            + (
-                " (edited " + m.edited_at.astimezone().strftime("%Y/%m/%d %H:%M") + ")"
-                if m.edited_at
-                else ""
-            )
-            + "\n"
-        )
-        if m.type == discord.MessageType.reply:
-            rep = m.reference.resolved
-            if isinstance(rep, discord.DeletedReferencedMessage):
-                preheader = "Original message was deleted"
-            elif not rep:
-                preheader = "Message could not be loaded"
-            else:
-                preheader = (
-                    "↗️ "
-                    + ("[BOT] " if rep.author.bot else "")
-                    + ("@" if rep.author in m.mentions else "")
-                    + rep.author.name
-                    + " "
-                    + rep.clean_content[:50]
-                    + ("..." if len(rep.clean_content) > 50 else "")
-                    + "\n"
-                )
-        else:
-            preheader = ""
-        add = preheader + header
-        if m.is_system():
-            add += m.system_content
-            if m.system_content:
-                blank_content = False
+
+async def log_channel(bot, channel, path, zip_files=False, start_ts=None, end_ts=None):
+    """Archives a channel to `path`.txt, and its files to `path` (files).zip.
+
+    Both are written as the history comes in, so nothing piles up in memory.
+    Returns the paths of the text file and the zip file, if anything was zipped."""
+    return await write_archive(
+        bot, history_records(channel, start_ts, end_ts), path, zip_files
+    )
+
+
+async def write_archive(bot, records, path, zip_files=False, files_path=None):
+    """Writes message records out as `path`.txt and `path` (files).zip.
+
+    Attachments already saved under `files_path` are zipped from there."""
+    txt_path = f"{path}.txt"
+    zip_path = f"{path} (files).zip"
+    z = None
+    # (filename, size, task) for each download, in message order.
+    downloads = deque()
+    in_flight = 0
+    # Attachments that couldn't be downloaded, noted at the end of the text.
+    failed = []
+
+    async def store_download():
+        nonlocal in_flight
+        fn, size, task = downloads[0]
+        try:
+            data = await task
+        except Exception:
+            data = None
+        downloads.popleft()
+        in_flight -= size
+        if data is None:
+            return failed.append(fn)
+        # Compressing happens off the event loop.
+        if isinstance(data, str):
+            store = functools.partial(z.write, data, fn)
         else:
-            add += m.clean_content
-            if m.clean_content:
-                blank_content = False
-
-        for a in m.attachments:
-            if not blank_content:
-                add += "\n"
-            if zip_files:
-                fn = f"{a.id}-{a.filename}"
-                f = await a.read()
-                z.writestr(fn, f)
-                zipped_count += 1
-                add += textify_attach((a.filename, fn))
-            else:
-                add += textify_attach((a.filename, None))
-            blank_content = False
-
-        for e in m.embeds:
-            if e.type == "rich":
-                if not blank_content:
-                    add += "\n"
-                add += textify_embed(e)
-                blank_content = False
-
-        if m.reactions:
-            if not blank_content:
-                add += "\n"
-            add += " ".join(
-                [f"[ {str(rea.emoji)} {rea.count} ]" for rea in m.reactions]
-            )
-            blank_content = False
+            store = functools.partial(z.writestr, fn, data)
+        await asyncio.get_running_loop().run_in_executor(None, store)
 
-        add += "\n\n"
-        st = st + add
+    try:
+        with open(txt_path, "w", encoding="UTF-8") as txt:
+            async for r in records:
+                if zip_files:
+                    for a in r["attachments"]:
+                        fn = f"{a['id']}-{a['filename']}"
+                        if not z:
+                            z = zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED)
+                        if files_path and os.path.exists(f"{files_path}/{fn}"):
+                            downloads.append(
+                                (
+                                    fn,
+                                    0,
+                                    asyncio.create_task(
+                                        local_file(f"{files_path}/{fn}")
+                                    ),
+                                )
+                            )
+                            continue
+                        while downloads and (
+                            len(downloads) >= download_concurrency
+                            or in_flight + a["size"] > download_bytes
+                        ):
+                            await store_download()
+                        downloads.append(
+                            (
+                                fn,
+                                a["size"],
+                                asyncio.create_task(download(bot, a["url"])),
+                            )
+                        )
+                        in_flight += a["size"]
+                txt.write(textify_record(r, zip_files))
 
-    if zip_files:
-        if zipped_count:
+            while downloads:
+                await store_download()
+            if failed:
+                txt.write(
+                    "These attachments could not be downloaded:\n"
+                    + "".join(f"- {fn}\n" for fn in failed)
+                    + "\n"
+                )
+    finally:
+        for _, _, task in downloads:
+            task.cancel()
+        if z:
             z.close()
-            b.seek(0)
-            return (st, b)
-        else:
-            return (st, None)
+
+    return (txt_path, zip_path if z else None)
+
+
+# Journals
+
+# Toss sessions are recorded as they happen, one JSON event per line, so
+# closing one doesn't need to page through the whole channel. Attachments
+# are saved next to the journal as they're posted.
+
+
+def journal_path(session_path):
+    return f"{session_path}/journal.jsonl"
+
+
+def journal_files_path(session_path):
+    return f"{session_path}/journal files"
+
+
+def start_journal(session_path):
+    os.makedirs(journal_files_path(session_path), exist_ok=True)
+    append_journal(session_path, {"type": "start"})
+
+
+def append_journal(session_path, event):
+    with open(journal_path(session_path), "a", encoding="UTF-8") as f:
+        f.write(json.dumps(event) + "\n")
+
+
+def drop_journal(session_path):
+    shutil.rmtree(journal_files_path(session_path), ignore_errors=True)
+    os.remove(journal_path(session_path))
+
+
+async def finish_journal(bot, channel, path, session_path):
+    """Archives a journaled channel like log_channel, then removes the journal.
+
+    Anything the journal missed (the bot was down, or reconnected) is paged
+    from the channel history between the messages either side of the gap."""
+    records = {}
+    gaps = []
+    # Messages whose attachments couldn't be saved, fetched again for fresh URLs.
+    refetch = []
+    last_id = None
+    with open(journal_path(session_path), "r", encoding="UTF-8") as f:
+        for line in f:
+            event = json.loads(line)
+            kind = event.pop("type")
+            if kind == "gap" and "id" in event:
+                refetch.append(event["id"])
+            elif kind == "gap":
+                if not gaps or gaps[-1][1] is not None:
+                    gaps.append([last_id, None])
+            elif kind == "message":
+                if gaps and gaps[-1][1] is None:
+                    gaps[-1][1] = event["id"]
+                records[event["id"]] = event
+                last_id = event["id"]
+            elif kind == "start" or event["id"] not in records:
+                continue
+            elif kind == "edit":
+                records[event["id"]].update(event)
+            elif kind == "delete":
+                del records[event["id"]]
+            elif kind == "reaction":
+                reactions = records[event["id"]]["reactions"]
+                reactions[event["emoji"]] = (
+                    reactions.get(event["emoji"], 0) + event["count"]
+                )
+                if reactions[event["emoji"]] <= 0:
+                    del reactions[event["emoji"]]
+            elif kind == "clear" and "emoji" in event:
+                records[event["id"]]["reactions"].pop(event["emoji"], None)
+            elif kind == "clear":
+                records[event["id"]]["reactions"] = {}
+
+    gaps += [[message_id - 1, message_id + 1] for message_id in refetch]
+    for after, before in gaps:
+        async for r in history_records(
+            channel,
+            discord.Object(after) if after else None,
+            discord.Object(before) if before else None,
+        ):
+            records[r["id"]] = r
+
+    async def journal_records():
+        for message_id in sorted(records):
+            yield records[message_id]
+
+    archive = await write_archive(
+        bot,
+        journal_records(),
+        path,
+        zip_files=True,
+        files_path=journal_files_path(session_path),
+    )
+    drop_journal(session_path)
+    return archive
+
+
+def count_text(path):
+    """Counts the lines, words and characters in a text file, a line at a time."""
+    lines, words, characters = 1, 0, 0
+    with open(path, "r", encoding="UTF-8", newline="") as f:
+        for line in f:
+            lines += line.count("\n")
+            words += len(line.split())
+            characters += len(line)
+    return lines, words, characters
+
+
+def finish_text(path, footer):
+    """Appends a footer to a text file and counts it. Blocking, for executors."""
+    with open(path, "a", encoding="UTF-8") as f:
+        f.write(footer)
+    return count_text(path)
+
+
+def count_zip(path):
+    with zipfile.ZipFile(path, "r") as z:
+        return len(z.namelist())
 
 
 def textify_attach(files, limit=40):
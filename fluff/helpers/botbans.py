@@ -0,0 +1,35 @@
+import json
+from helpers.datafiles import get_botfile, set_botfile
+
+# Botbanned user IDs, checked on every message. Kept in step with the
+# "botban" list in botusers.json, which is only written on changes.
+botbanned = set()
+
+
+def load_botbans():
+    botbanned.clear()
+    botbanned.update(get_botfile("botusers").get("botban", []))
+
+
+def is_botbanned(uid):
+    return uid in botbanned
+
+
+def add_botban(uid):
+    if uid in botbanned:
+        return False
+    botusers = get_botfile("botusers")
+    botusers.setdefault("botban", []).append(uid)
+    set_botfile("botusers", json.dumps(botusers))
+    botbanned.add(uid)
+    return True
+
+
+def remove_botban(uid):
+    if uid not in botbanned:
+        return False
+    botusers = get_botfile("botusers")
+    botusers["botban"].remove(uid)
+    set_botfile("botusers", json.dumps(botusers))
+    botbanned.discard(uid)
+    return True
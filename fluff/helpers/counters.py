@@ -0,0 +1,56 @@
+import time
+
+
+class WindowCounter:
+    """Counts events per key over the last `window` seconds.
+
+    Only the newest `limit` event times are kept for each key, and keys
+    with nothing left in the window are dropped when pruned, so it stays
+    small however many keys come and go."""
+
+    def __init__(self, window, limit=64):
+        self.window = window
+        self.limit = limit
+        self.events = {}
+        self.changed = False
+
+    def expired(self, key, now):
+        times = self.events[key]
+        while times and times[0] <= now - self.window:
+            times.pop(0)
+        if not times:
+            del self.events[key]
+            return True
+        return False
+
+    def count(self, key):
+        if key not in self.events or self.expired(key, time.time()):
+            return 0
+        return len(self.events[key])
+
+    def __contains__(self, key):
+        return self.count(key) > 0
+
+    def add(self, key):
+        """Records an event and returns how many are in the window now."""
+        self.count(key)
+        times = self.events.setdefault(key, [])
+        times.append(int(time.time()))
+        del times[: -self.limit]
+        self.changed = True
+        return len(times)
+
+    def prune(self):
+        now = time.time()
+        for key in list(self.events):
+            self.expired(key, now)
+
+    def snapshot(self):
+        self.prune()
+        self.changed = False
+        return [[*key, times] for key, times in self.events.items()]
+
+    def restore(self, snapshot):
+        for *key, times in snapshot:
+            self.events[tuple(key)] = times[-self.limit :]
+        self.prune()
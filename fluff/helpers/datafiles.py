@@ -2,6 +2,13 @@ import json
 import os
 import datetime
 import math
+import asyncio
+import atexit
+import tempfile
+import logging
+import config
+from collections import OrderedDict
+from helpers.sqlstorage import SQLiteStorage
 
 # Definitions
 
@@ -13,6 +20,151 @@ userlog_event_types = {
     "notes": "Note",
 }
 
+# Storage
+
+# The JSON tree under data/ is the default. With storage = "sqlite" in the
+# config, the files SQLiteStorage owns are kept in data/fluff.db instead.
+storage = None
+
+
+def load_storage():
+    global storage
+    if storage:
+        storage.close()
+    storage = None
+    if getattr(config, "storage", "json") == "sqlite":
+        storage = SQLiteStorage("data/fluff.db")
+    uncache()
+
+
+def stored(path):
+    return storage and storage.owns(path)
+
+
+def row_writes(path):
+    """Whether changes to a stored file can be written as rows.
+
+    A whole-document write still pending for it would replace them with an
+    older copy when flushed, so the document is written again instead."""
+    return stored(path) and path not in pending
+
+
+def migrate_storage():
+    """Imports the JSON data tree into the configured storage, if it isn't JSON."""
+    if not storage:
+        return None
+    flush_files()
+    counts = storage.import_tree("data")
+    uncache()
+    return counts
+
+
+# Cache
+
+# Parsed files are kept in memory and handed out as-is, so every caller shares
+# the same document until it is replaced by a set_* call. User files get their
+# own LRU store, as there's one per user.
+filecache = {}
+usercache = OrderedDict()
+usercache_size = 4096
+
+# While the bot is running, writes are held here for flush_delay seconds so
+# that a burst of set_* calls on one file only hits the disk once.
+pending = {}
+flush_delay = 1.0
+# A write that fails stays pending and is tried again this much later.
+flush_retry = 30.0
+
+log = logging.getLogger("discord")
+
+
+def cache_file(path, contents):
+    if path.startswith("data/users/"):
+        usercache[path] = contents
+        usercache.move_to_end(path)
+        while len(usercache) > usercache_size:
+            usercache.popitem(last=False)
+    else:
+        filecache[path] = contents
+    return contents
+
+
+def read_file(path, make):
+    if path.startswith("data/users/"):
+        if path in usercache:
+            usercache.move_to_end(path)
+            return usercache[path]
+    elif path in filecache:
+        return filecache[path]
+
+    if path in pending:
+        return cache_file(path, json.loads(pending[path]))
+    if stored(path):
+        return cache_file(path, storage.load(path))
+    if not os.path.exists(path):
+        return cache_file(path, make())
+    with open(path, "r") as f:
+        return cache_file(path, json.load(f))
+
+
+def write_file(path, contents):
+    cache_file(path, json.loads(contents))
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return save_file(path, contents)
+    if path not in pending:
+        loop.call_later(flush_delay, flush_file, path)
+    pending[path] = contents
+
+
+def save_file(path, contents):
+    """Replaces a file in one step, so a crash never leaves half of it behind."""
+    if stored(path):
+        return storage.save(path, contents)
+    fd, temp = tempfile.mkstemp(
+        dir=os.path.dirname(path), prefix=".", suffix=".tmp", text=True
+    )
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(contents)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, path)
+    except:
+        os.remove(temp)
+        raise
+
+
+def flush_file(path):
+    if path not in pending:
+        return
+    try:
+        save_file(path, pending[path])
+    except Exception:
+        log.exception(f"Failed to save {path}, it will be retried.")
+        try:
+            asyncio.get_running_loop().call_later(flush_retry, flush_file, path)
+        except RuntimeError:
+            pass
+        return
+    del pending[path]
+
+
+@atexit.register
+def flush_files():
+    for path in list(pending):
+        flush_file(path)
+
+
+def uncache(path="data"):
+    """Drops cached files at or under a path, for when they're replaced on disk."""
+    path = path.rstrip("/")
+    for store in (filecache, usercache, pending):
+        for key in [k for k in store if k == path or k.startswith(path + "/")]:
+            del store[key]
+
+
 # Bot Files
 
 
@@ -25,15 +177,11 @@ def make_botfile(filename):
 
 
 def get_botfile(filename):
-    if not os.path.exists(f"data/{filename}.json"):
-        make_botfile(filename)
-    with open(f"data/{filename}.json", "r") as f:
-        return json.load(f)
+    return read_file(f"data/{filename}.json", lambda: make_botfile(filename))
 
 
 def set_botfile(filename, contents):
-    with open(f"data/{filename}.json", "w") as f:
-        f.write(contents)
+    write_file(f"data/{filename}.json", contents)
 
 
 # User Files
@@ -48,15 +196,23 @@ def make_userfile(userid, filename):
 
 
 def get_userfile(userid, filename):
-    if not os.path.exists(f"data/users/{userid}/{filename}.json"):
-        make_userfile(userid, filename)
-    with open(f"data/users/{userid}/{filename}.json", "r") as f:
-        return json.load(f)
+    return read_file(
+        f"data/users/{userid}/{filename}.json",
+        lambda: make_userfile(userid, filename),
+    )
+
+
+def userfile_exists(userid, filename):
+    path = f"data/users/{userid}/{filename}.json"
+    if path in usercache or path in pending:
+        return True
+    if stored(path):
+        return storage.exists(path)
+    return os.path.exists(path)
 
 
 def set_userfile(userid, filename, contents):
-    with open(f"data/users/{userid}/{filename}.json", "w") as f:
-        f.write(contents)
+    write_file(f"data/users/{userid}/{filename}.json", contents)
 
 
 # Guild Files
@@ -71,15 +227,14 @@ def make_guildfile(serverid, filename):
 
 
 def get_guildfile(serverid, filename):
-    if not os.path.exists(f"data/servers/{serverid}/{filename}.json"):
-        make_guildfile(serverid, filename)
-    with open(f"data/servers/{serverid}/{filename}.json", "r") as f:
-        return json.load(f)
+    return read_file(
+        f"data/servers/{serverid}/{filename}.json",
+        lambda: make_guildfile(serverid, filename),
+    )
 
 
 def set_guildfile(serverid, filename, contents):
-    with open(f"data/servers/{serverid}/{filename}.json", "w") as f:
-        f.write(contents)
+    write_file(f"data/servers/{serverid}/{filename}.json", contents)
 
 
 # Toss Files
@@ -94,15 +249,14 @@ def make_tossfile(serverid, filename):
 
 
 def get_tossfile(serverid, filename):
-    if not os.path.exists(f"data/servers/{serverid}/toss/{filename}.json"):
-        make_tossfile(serverid, filename)
-    with open(f"data/servers/{serverid}/toss/{filename}.json", "r") as f:
-        return json.load(f)
+    return read_file(
+        f"data/servers/{serverid}/toss/{filename}.json",
+        lambda: make_tossfile(serverid, filename),
+    )
 
 
 def set_tossfile(serverid, filename, contents):
-    with open(f"data/servers/{serverid}/toss/{filename}.json", "w") as f:
-        f.write(contents)
+    write_file(f"data/servers/{serverid}/toss/{filename}.json", contents)
 
 
 # Default Fills
@@ -166,24 +320,32 @@ def add_userlog(sid, uid, issuer, reason, event_type):
     if event_type not in userlogs[uid]:
         userlogs[uid][event_type] = []
     userlogs[uid][event_type].append(log_data)
-    set_guildfile(sid, "userlog", json.dumps(userlogs))
+    save_userlog(sid, userlogs, [(uid, event_type, log_data)])
     return len(userlogs[uid][event_type])
 
 
 def toss_userlog(sid, uid, issuer, mlink, cid):
-    userlogs, uid = fill_userlog(sid, uid)
+    return toss_userlogs(sid, [uid], issuer, mlink, cid)[0]
 
-    toss_data = {
-        "issuer_id": issuer.id,
-        "session_id": cid,
-        "post_link": mlink,
-        "timestamp": int(datetime.datetime.now().timestamp()),
-    }
-    if "tosses" not in userlogs[uid]:
-        userlogs[uid]["tosses"] = []
-    userlogs[uid]["tosses"].append(toss_data)
-    set_guildfile(sid, "userlog", json.dumps(userlogs))
-    return len(userlogs[uid]["tosses"])
+
+def toss_userlogs(sid, uids, issuer, mlink, cid):
+    """Logs one toss of several users in a single write."""
+    entries = []
+    for uid in uids:
+        userlogs, uid = fill_userlog(sid, uid)
+
+        toss_data = {
+            "issuer_id": issuer.id,
+            "session_id": cid,
+            "post_link": mlink,
+            "timestamp": int(datetime.datetime.now().timestamp()),
+        }
+        if "tosses" not in userlogs[uid]:
+            userlogs[uid]["tosses"] = []
+        userlogs[uid]["tosses"].append(toss_data)
+        entries.append((uid, "tosses", toss_data))
+    save_userlog(sid, userlogs, entries)
+    return [len(userlogs[uid]["tosses"]) for uid, _, _ in entries]
 
 
 def watch_userlog(sid, uid, issuer, watch_state, tracker_thread=None, tracker_msg=None):
@@ -194,12 +356,25 @@ def watch_userlog(sid, uid, issuer, watch_state, tracker_thread=None, tracker_ms
         "thread": tracker_thread,
         "message": tracker_msg,
     }
+    if row_writes(f"data/servers/{sid}/userlog.json"):
+        return storage.set_watch(sid, int(uid), userlogs[uid]["watch"])
     set_guildfile(sid, "userlog", json.dumps(userlogs))
     return
 
 
+def save_userlog(sid, userlogs, entries):
+    # Storage backends append the (uid, event_type, entry) entries,
+    # the JSON tree rewrites the file.
+    if row_writes(f"data/servers/{sid}/userlog.json"):
+        return storage.add_userlogs(sid, entries)
+    set_guildfile(sid, "userlog", json.dumps(userlogs))
+
+
 # Dishtimer Features
 
+# Called with (job_type, timestamp, job_name) whenever add_job stores a job.
+job_hooks = []
+
 
 def add_job(job_type, job_name, job_details, timestamp):
     timestamp = str(math.floor(timestamp))
@@ -213,18 +388,39 @@ def add_job(job_type, job_name, job_details, timestamp):
         ctab[job_type][timestamp] = {}
 
     ctab[job_type][timestamp][job_name] = job_details
-    set_botfile("timers", json.dumps(ctab))
+    if row_writes("data/timers.json"):
+        storage.add_job(job_type, timestamp, job_name, job_details)
+    else:
+        set_botfile("timers", json.dumps(ctab))
+
+    for hook in job_hooks:
+        hook(job_type, timestamp, job_name)
 
 
 def delete_job(timestamp, job_type, job_name):
-    timestamp = str(timestamp)
-    job_name = str(job_name)
+    delete_jobs([(timestamp, job_type, job_name)])
+
+
+def delete_jobs(jobs):
+    """Deletes (timestamp, job_type, job_name) jobs in a single write."""
+    jobs = [
+        (str(timestamp), job_type, str(job_name))
+        for timestamp, job_type, job_name in jobs
+    ]
     ctab = get_botfile("timers")
 
-    del ctab[job_type][timestamp][job_name]
+    for timestamp, job_type, job_name in jobs:
+        if timestamp not in ctab.get(job_type, {}):
+            continue
+        ctab[job_type][timestamp].pop(job_name, None)
 
-    # smh, not checking for empty timestamps. Smells like bloat!
-    if not ctab[job_type][timestamp]:
-        del ctab[job_type][timestamp]
+        # smh, not checking for empty timestamps. Smells like bloat!
+        if not ctab[job_type][timestamp]:
+            del ctab[job_type][timestamp]
 
+    if row_writes("data/timers.json"):
+        return storage.delete_jobs(jobs)
     set_botfile("timers", json.dumps(ctab))
+
+
+load_storage()
@@ -1,54 +1,217 @@
 # This Helper contains code from Archiver, which was made by Roadcrosser.
 # 🖤 If by any chance you're reading, we all miss you.
 # https://github.com/Roadcrosser/archiver
-import os.path
-import httplib2
-
-from pydrive2.auth import GoogleAuth
-from pydrive2.drive import GoogleDrive
-from oauth2client.service_account import ServiceAccountCredentials
+import os
+import json
+import time
+import random
+import asyncio
 
+from helpers.datafiles import get_botfile, set_botfile
 from helpers.sv_config import get_config
+from helpers.loadtimes import timed
 
+# Where uploads go. Point this somewhere else to upload to a stand-in server.
+api_url = "https://www.googleapis.com"
+# Resumable uploads are sent in chunks of this size. Must be a multiple of 256 KiB.
+chunk_size = 8 * 1024 * 1024
+# Failed uploads are retried after 30s, then 60s, 120s... up to an hour apart.
+retry_base = 30
+retry_max = 3600
 
-def authenticate():
-    """Return Google oAuth credentials"""
-    credentials = ServiceAccountCredentials.from_json_keyfile_name(
-        "./data/service_account.json", "https://www.googleapis.com/auth/drive"
-    )
-    credentials.authorize(httplib2.Http())
-    gauth = GoogleAuth()
-    gauth.credentials = credentials
-    return gauth
+service_account = "./data/service_account.json"
+credentials = None
+uploads_changed = asyncio.Event()
+
+
+def get_credentials():
+    """Return cached Google oAuth credentials, loading them the first time."""
+    global credentials
+    if not credentials:
+        # Only archiving needs these, so they're loaded the first time it does.
+        with timed("oauth2client"):
+            from oauth2client.service_account import ServiceAccountCredentials
+        credentials = ServiceAccountCredentials.from_json_keyfile_name(
+            service_account, "https://www.googleapis.com/auth/drive"
+        )
+    return credentials
+
+
+def get_token():
+    # Refreshes the token when it's missing or expired. Blocking, for executors.
+    import httplib2
+
+    return get_credentials().get_access_token(httplib2.Http()).access_token
 
 
 async def upload(ctx, filename, file_path, dotzip):
-    """Upload a log to Google Drive"""
-    credentials = authenticate()
-    drive = GoogleDrive(credentials)
-    folder = get_config(ctx.guild.id, "drive", "folder")
-    full_path = os.path.join(file_path, f"{filename}.txt")
+    """Queue a log to be uploaded to Google Drive, with its zip file at the path `dotzip`
 
-    f = drive.CreateFile(
-        {
-            "parents": [{"kind": "drive#fileLink", "id": folder}],
-            "title": f"{filename}.txt",
-        }
+    Nothing is queued unless the server has a Drive folder and the bot has
+    a service account, as those uploads could never go through."""
+    folder = get_config(ctx.guild.id, "drive", "folder")
+    if not folder or not os.path.exists(service_account):
+        return
+    # Like before the queue, only the text file is removed once it's on Drive.
+    queue_upload(
+        folder,
+        f"{filename}.txt",
+        os.path.join(file_path, f"{filename}.txt"),
+        remove=True,
     )
-    with open(full_path, encoding="utf-8") as file:
-        f.SetContentString(file.read())
-        f.Upload()
-
     if dotzip:
-        f_zip = drive.CreateFile(
-            {
-                "parents": [{"kind": "drive#fileLink", "id": folder}],
-                "title": f"{filename} (files).zip",
-            }
+        queue_upload(folder, f"{filename} (files).zip", dotzip, "application/zip")
+
+
+# Upload Queue
+
+# Uploads are kept in data/uploads.json until they're done, so they survive
+# restarts and Drive outages. The worker takes them from there.
+
+
+def queue_upload(folder, title, path, mimetype="text/plain", remove=False):
+    uploads = get_botfile("uploads")
+    uploads[path] = {
+        "folder": folder,
+        "title": title,
+        "mimetype": mimetype,
+        "session": None,
+        "attempts": 0,
+        "next_try": 0,
+        "error": None,
+        "remove": remove,
+    }
+    set_botfile("uploads", json.dumps(uploads))
+    uploads_changed.set()
+
+
+async def upload_worker(session):
+    """Drains the upload queue forever, one file at a time."""
+    while True:
+        uploads_changed.clear()
+        uploads = get_botfile("uploads")
+        now = time.time()
+        due = [path for path in uploads if uploads[path]["next_try"] <= now]
+        for path in due:
+            await try_upload(session, path)
+        uploads = get_botfile("uploads")
+        timeout = (
+            min(u["next_try"] for u in uploads.values()) - time.time()
+            if uploads
+            else None
         )
-        f_zip.content = dotzip
-        f_zip["mimeType"] = "application/zip"
-        upload = f_zip.Upload()
+        if timeout is not None and timeout <= 0:
+            continue
+        try:
+            await asyncio.wait_for(uploads_changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def try_upload(session, path):
+    entry = get_botfile("uploads").get(path)
+    if not entry:
+        return
+    try:
+        if os.path.exists(path):
+            await upload_file(session, path, entry)
+    except Exception as e:
+        entry["attempts"] += 1
+        entry["error"] = repr(e)
+        entry["next_try"] = time.time() + min(
+            retry_base * 2 ** (entry["attempts"] - 1), retry_max
+        ) * random.uniform(1, 1.25)
+        return save_upload(path, entry)
+    save_upload(path, None)
+    if entry.get("remove") and os.path.exists(path):
+        os.remove(path)
+
+
+def save_upload(path, entry):
+    uploads = get_botfile("uploads")
+    if entry:
+        uploads[path] = entry
+    else:
+        uploads.pop(path, None)
+    set_botfile("uploads", json.dumps(uploads))
+
+
+async def upload_file(session, path, entry):
+    """Uploads a file in chunks, picking up where the last try left off."""
+    loop = asyncio.get_running_loop()
+    token = await loop.run_in_executor(None, get_token)
+    size = os.path.getsize(path)
+
+    offset = None
+    if entry["session"]:
+        offset = await upload_offset(session, entry["session"], token, size)
+    if offset is None:
+        entry["session"] = await start_upload(session, token, entry, size)
+        # Saved now, so a restart can resume this upload instead of redoing it.
+        save_upload(path, entry)
+        offset = 0
+
+    while offset is not True:
+        chunk = await loop.run_in_executor(None, read_chunk, path, offset)
+        headers = {"Authorization": f"Bearer {token}"}
+        if chunk:
+            headers["Content-Range"] = (
+                f"bytes {offset}-{offset + len(chunk) - 1}/{size}"
+            )
+        else:
+            headers["Content-Range"] = f"bytes */{size}"
+        async with session.put(entry["session"], data=chunk, headers=headers) as r:
+            offset = check_upload(r, size)
+        if offset is None:
+            raise RuntimeError("Upload session expired mid-upload.")
+
+
+def read_chunk(path, offset):
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return f.read(chunk_size)
+
+
+async def start_upload(session, token, entry, size):
+    async with session.post(
+        f"{api_url}/upload/drive/v3/files?uploadType=resumable",
+        headers={
+            "Authorization": f"Bearer {token}",
+            "X-Upload-Content-Type": entry["mimetype"],
+            "X-Upload-Content-Length": str(size),
+        },
+        json={"name": entry["title"], "parents": [entry["folder"]]},
+    ) as r:
+        if r.status == 401:
+            get_credentials().access_token = None
+        r.raise_for_status()
+        return r.headers["Location"]
+
+
+async def upload_offset(session, session_url, token, size):
+    async with session.put(
+        session_url,
+        headers={
+            "Authorization": f"Bearer {token}",
+            "Content-Range": f"bytes */{size}",
+        },
+    ) as r:
+        return check_upload(r, size)
+
 
-        if upload:
-            return os.remove(full_path)
+def check_upload(r, size):
+    """Returns True when an upload is done, None when its session is gone,
+    or the offset to send next."""
+    if r.status in (200, 201):
+        return True
+    if r.status in (404, 410):
+        return None
+    if r.status == 308:
+        # "bytes=0-1234" is what Drive has, nothing at all means none of it.
+        if "Range" not in r.headers:
+            return 0
+        return int(r.headers["Range"].split("-")[-1]) + 1
+    if r.status == 401:
+        get_credentials().access_token = None
+    r.raise_for_status()
+    raise RuntimeError(f"Unexpected upload response: {r.status}")
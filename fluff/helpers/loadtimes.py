@@ -0,0 +1,15 @@
+import time
+from contextlib import contextmanager
+
+# Seconds each cog, asset or library took to load, as last measured.
+# Heavy ones are only loaded on first use, so they show up when that happens.
+load_times = {}
+
+
+@contextmanager
+def timed(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        load_times[name] = time.perf_counter() - started
@@ -0,0 +1,93 @@
+import time
+import asyncio
+from helpers.sv_config import get_config
+from helpers.datafiles import fill_profile
+from helpers.errors import handle_code_error
+
+# Cogs handle messages by adding stages here instead of on_message listeners.
+# Name to (stage, feature, users_only).
+stages = {}
+# Name to a check of whether a feature is set up in a message's guild.
+features = {}
+# Name to [runs, total seconds, slowest run in seconds].
+timings = {}
+
+
+class MessageContext:
+    """What stages need to know about a message, worked out at most once."""
+
+    def __init__(self, bot, message):
+        self.bot = bot
+        self.message = message
+        self.guild = message.guild
+        # Messages from users in guilds, which is all most stages care about.
+        self.from_user = bool(
+            message.guild and not message.author.bot and not message.is_system()
+        )
+        self.features = {}
+        self.configs = {}
+        self._profile = None
+
+    def enabled(self, feature):
+        if feature not in self.features:
+            try:
+                self.features[feature] = bool(self.guild and features[feature](self))
+            except KeyError:
+                # Missing config sections count as not set up.
+                self.features[feature] = False
+        return self.features[feature]
+
+    def config(self, part, key):
+        if (part, key) not in self.configs:
+            self.configs[(part, key)] = get_config(self.guild.id, part, key)
+        return self.configs[(part, key)]
+
+    def role(self, part, key):
+        return self.bot.pull_role(self.guild, self.config(part, key))
+
+    @property
+    def profile(self):
+        if self._profile is None:
+            self._profile = fill_profile(self.message.author.id)
+        return self._profile
+
+
+def add_stage(name, stage, feature=None, users_only=True):
+    """Runs `stage(ctx)` for messages, skipping guilds without `feature`.
+
+    Unless users_only is False, messages from bots, system messages and DMs
+    are skipped too."""
+    stages[name] = (stage, feature, users_only)
+
+
+def remove_stage(name):
+    stages.pop(name, None)
+
+
+def add_feature(name, check):
+    features[name] = check
+
+
+async def run_stages(bot, message):
+    ctx = MessageContext(bot, message)
+    run = [
+        (name, stage)
+        for name, (stage, feature, users_only) in list(stages.items())
+        if (ctx.from_user or not users_only) and (not feature or ctx.enabled(feature))
+    ]
+    # Stages used to be separate listeners, so they still don't wait on each other.
+    await asyncio.gather(*[run_stage(bot, ctx, name, stage) for name, stage in run])
+
+
+async def run_stage(bot, ctx, name, stage):
+    started = time.perf_counter()
+    try:
+        await stage(ctx)
+    except Exception:
+        await handle_code_error(bot, f"stage {name}", (ctx.message,), {})
+    finally:
+        duration = time.perf_counter() - started
+        timing = timings.setdefault(name, [0, 0.0, 0.0])
+        timing[0] += 1
+        timing[1] += duration
+        timing[2] = max(timing[2], duration)
@@ -2,16 +2,26 @@ import random
 import discord
 import datetime
 import yaml
+from helpers.loadtimes import timed
 
-with open("assets/placeholders.yml", "r") as f:
-    placeholders = yaml.safe_load(f)
+placeholders = None
 game_type = discord.ActivityType.listening
-game_names = placeholders["games"]
+
+
+def get_placeholders():
+    """Return the placeholder messages, reading them the first time."""
+    global placeholders
+    if not placeholders:
+        with timed("assets/placeholders.yml"), open(
+            "assets/placeholders.yml", "r"
+        ) as f:
+            placeholders = yaml.safe_load(f)
+    return placeholders
 
 
 def random_msg(variant, **fills):
-    shorthands = placeholders["shorthands"]
-    string = random.choice(placeholders[variant])
+    shorthands = get_placeholders()["shorthands"]
+    string = random.choice(get_placeholders()[variant])
     if fills:
         for name in fills.keys():
             if not "{" + name + "}" in string:
@@ -21,7 +31,7 @@ def random_msg(variant, **fills):
 
 
 def generate_rule(rule, **fills):
-    rules = placeholders["rules"]
+    rules = get_placeholders()["rules"]
     selected_rule = random.choice(rules[rule])
     if fills:
         for name in fills.keys():
@@ -0,0 +1,120 @@
+from collections import OrderedDict
+from helpers.datafiles import get_userfile, userfile_exists
+
+# The configured prefixes as a trie of lowercased characters.
+# A None key marks the end of a prefix.
+prefix_trie = {}
+# User prefixes by user ID, read from profiles the first time a user is seen.
+# Like datafiles' user files, only the most recently used are kept.
+userprefixes = OrderedDict()
+usercache_size = 4096
+
+
+def cache_user(store, uid, value):
+    store[uid] = value
+    store.move_to_end(uid)
+    while len(store) > usercache_size:
+        store.popitem(last=False)
+    return value
+
+
+def cached_user(store, uid):
+    if uid in store:
+        store.move_to_end(uid)
+        return True
+    return False
+
+
+def load_prefixes(prefixes):
+    prefix_trie.clear()
+    for prefix in prefixes:
+        node = prefix_trie
+        for c in prefix:
+            node = node.setdefault(c.lower(), {})
+        node[None] = True
+
+
+def match_prefixes(content):
+    """Returns the configured prefixes that start content, as they were typed.
+
+    Matching ignores case, and the longest match comes first."""
+    node = prefix_trie
+    matches = [""] if None in node else []
+    for i, c in enumerate(content):
+        node = node.get(c.lower())
+        if node is None:
+            break
+        if None in node:
+            matches.append(content[: i + 1])
+    return matches[::-1]
+
+
+def get_userprefixes(uid):
+    if cached_user(userprefixes, uid):
+        return userprefixes[uid]
+    if userfile_exists(uid, "profile"):
+        prefixes = get_userfile(uid, "profile").get("prefixes") or []
+    else:
+        prefixes = []
+    return cache_user(userprefixes, uid, prefixes)
+
+
+def set_userprefixes(uid, prefixes):
+    cache_user(userprefixes, uid, list(prefixes))
+
+
+def forget_userprefixes(uid=None):
+    if uid is None:
+        userprefixes.clear()
+    else:
+        userprefixes.pop(uid, None)
+
+
+# User aliases by user ID, as tries like the one above. Unlike prefixes,
+# aliases are matched as typed, and the end marker holds the alias' position
+# in the profile and the command it stands for.
+aliastries = OrderedDict()
+
+
+def build_aliastrie(aliases):
+    trie = {}
+    for i, alias in enumerate(aliases):
+        command, alias = next(iter(alias.items()))
+        node = trie
+        for c in alias:
+            node = node.setdefault(c, {})
+        node.setdefault(None, (i, command))
+    return trie
+
+
+def match_alias(uid, content):
+    """Returns (alias, command) for the user's alias that starts content, or None.
+
+    Like going through the aliases in order, the first one added wins."""
+    if cached_user(aliastries, uid):
+        node = aliastries[uid]
+    else:
+        if userfile_exists(uid, "profile"):
+            aliases = get_userfile(uid, "profile").get("aliases") or []
+        else:
+            aliases = []
+        node = cache_user(aliastries, uid, build_aliastrie(aliases))
+    match = None
+    for i, c in enumerate(content):
+        node = node.get(c)
+        if node is None:
+            break
+        if None in node and (not match or node[None][0] < match[0]):
+            match = (node[None][0], content[: i + 1], node[None][1])
+    return match and match[1:]
+
+
+def set_useraliases(uid, aliases):
+    cache_user(aliastries, uid, build_aliastrie(aliases))
+
+
+def forget_useraliases(uid=None):
+    if uid is None:
+        aliastries.clear()
+    else:
+        aliastries.pop(uid, None)
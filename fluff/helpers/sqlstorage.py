@@ -0,0 +1,268 @@
+import json
+import os
+import re
+import sqlite3
+
+schema = """
+CREATE TABLE IF NOT EXISTS userlog (
+    guild_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    event_type TEXT NOT NULL,
+    timestamp INTEGER,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS userlog_member ON userlog (guild_id, user_id);
+CREATE TABLE IF NOT EXISTS userlog_watch (
+    guild_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (guild_id, user_id)
+);
+CREATE TABLE IF NOT EXISTS timers (
+    job_type TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,
+    job_name TEXT NOT NULL,
+    details TEXT NOT NULL,
+    PRIMARY KEY (job_type, timestamp, job_name)
+);
+CREATE INDEX IF NOT EXISTS timers_due ON timers (timestamp);
+CREATE TABLE IF NOT EXISTS tosses (
+    guild_id INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (guild_id, channel)
+);
+CREATE TABLE IF NOT EXISTS profiles (
+    user_id INTEGER PRIMARY KEY,
+    data TEXT NOT NULL
+);
+"""
+
+# The data files this storage takes over, and what they're called in here.
+owned_files = {
+    "timers": re.compile(r"data/timers\.json"),
+    "userlog": re.compile(r"data/servers/(\d+)/userlog\.json"),
+    "tosses": re.compile(r"data/servers/(\d+)/toss/tosses\.json"),
+    "profile": re.compile(r"data/users/(\d+)/profile\.json"),
+}
+
+# Userlogs always have these, as fill_userlog makes them, even when empty.
+userlog_events = ("warns", "mutes", "kicks", "bans", "notes")
+
+
+def new_userlog():
+    userlog = {event_type: [] for event_type in userlog_events}
+    userlog["watch"] = {"state": False, "thread": None, "message": None}
+    return userlog
+
+
+class SQLiteStorage:
+    """Keeps userlogs, timers, tosses and profiles in one SQLite database.
+
+    Documents go in and come out in the same shape as their JSON files,
+    so datafiles can hand them to callers as usual. The append-style
+    operations (userlog entries, single jobs) touch one row each."""
+
+    def __init__(self, path="data/fluff.db"):
+        self.path = path
+        self.connect()
+
+    def connect(self):
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.db = sqlite3.connect(self.path)
+        self.db.executescript(schema)
+
+    def close(self):
+        self.db.close()
+
+    def owns(self, path):
+        for kind, pattern in owned_files.items():
+            match = pattern.fullmatch(path)
+            if match:
+                return kind, int(match.group(1)) if match.groups() else None
+        return None
+
+    def exists(self, path):
+        kind, key = self.owns(path)
+        if kind == "profile":
+            query = "SELECT 1 FROM profiles WHERE user_id = ?"
+        elif kind == "tosses":
+            query = "SELECT 1 FROM tosses WHERE guild_id = ?"
+        elif kind == "userlog":
+            query = "SELECT 1 FROM userlog WHERE guild_id = ?"
+        else:
+            return True
+        return bool(self.db.execute(query, (key,)).fetchone())
+
+    # Documents
+
+    def load(self, path):
+        kind, key = self.owns(path)
+        if kind == "timers":
+            ctab = {}
+            for job_type, timestamp, job_name, details in self.db.execute(
+                "SELECT job_type, timestamp, job_name, details FROM timers"
+            ):
+                ctab.setdefault(job_type, {}).setdefault(str(timestamp), {})[
+                    job_name
+                ] = json.loads(details)
+            return ctab
+        elif kind == "userlog":
+            userlogs = {}
+            for uid, event_type, data in self.db.execute(
+                "SELECT user_id, event_type, data FROM userlog WHERE guild_id = ? ORDER BY rowid",
+                (key,),
+            ):
+                if str(uid) not in userlogs:
+                    userlogs[str(uid)] = new_userlog()
+                userlogs[str(uid)].setdefault(event_type, []).append(json.loads(data))
+            for uid, data in self.db.execute(
+                "SELECT user_id, data FROM userlog_watch WHERE guild_id = ?", (key,)
+            ):
+                if str(uid) not in userlogs:
+                    userlogs[str(uid)] = new_userlog()
+                userlogs[str(uid)]["watch"] = json.loads(data)
+            return userlogs
+        elif kind == "tosses":
+            return {
+                channel: json.loads(data)
+                for channel, data in self.db.execute(
+                    "SELECT channel, data FROM tosses WHERE guild_id = ?", (key,)
+                )
+            }
+        elif kind == "profile":
+            row = self.db.execute(
+                "SELECT data FROM profiles WHERE user_id = ?", (key,)
+            ).fetchone()
+            return json.loads(row[0]) if row else {}
+
+    def save(self, path, contents):
+        with self.db:
+            self.replace(path, json.loads(contents))
+
+    def replace(self, path, document):
+        kind, key = self.owns(path)
+        if kind == "timers":
+            self.db.execute("DELETE FROM timers")
+            self.db.executemany(
+                "INSERT INTO timers VALUES (?, ?, ?, ?)",
+                [
+                    (job_type, int(timestamp), job_name, json.dumps(details))
+                    for job_type, timestamps in document.items()
+                    for timestamp, jobs in timestamps.items()
+                    for job_name, details in jobs.items()
+                ],
+            )
+        elif kind == "userlog":
+            self.db.execute("DELETE FROM userlog WHERE guild_id = ?", (key,))
+            self.db.execute("DELETE FROM userlog_watch WHERE guild_id = ?", (key,))
+            for uid, events in document.items():
+                for event_type, entries in events.items():
+                    if event_type == "watch":
+                        self.db.execute(
+                            "INSERT INTO userlog_watch VALUES (?, ?, ?)",
+                            (key, int(uid), json.dumps(entries)),
+                        )
+                        continue
+                    self.db.executemany(
+                        "INSERT INTO userlog VALUES (?, ?, ?, ?, ?)",
+                        [
+                            (
+                                key,
+                                int(uid),
+                                event_type,
+                                entry.get("timestamp"),
+                                json.dumps(entry),
+                            )
+                            for entry in entries
+                        ],
+                    )
+        elif kind == "tosses":
+            self.db.execute("DELETE FROM tosses WHERE guild_id = ?", (key,))
+            self.db.executemany(
+                "INSERT INTO tosses VALUES (?, ?, ?)",
+                [
+                    (key, channel, json.dumps(data))
+                    for channel, data in document.items()
+                ],
+            )
+        elif kind == "profile":
+            self.db.execute(
+                "INSERT OR REPLACE INTO profiles VALUES (?, ?)",
+                (key, json.dumps(document)),
+            )
+
+    # Single rows
+
+    def add_userlogs(self, sid, entries):
+        with self.db:
+            self.db.executemany(
+                "INSERT INTO userlog VALUES (?, ?, ?, ?, ?)",
+                [
+                    (
+                        sid,
+                        int(uid),
+                        event_type,
+                        entry.get("timestamp"),
+                        json.dumps(entry),
+                    )
+                    for uid, event_type, entry in entries
+                ],
+            )
+
+    def set_watch(self, sid, uid, watch):
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO userlog_watch VALUES (?, ?, ?)",
+                (sid, uid, json.dumps(watch)),
+            )
+
+    def add_job(self, job_type, timestamp, job_name, job_details):
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO timers VALUES (?, ?, ?, ?)",
+                (job_type, int(timestamp), job_name, json.dumps(job_details)),
+            )
+
+    def delete_jobs(self, jobs):
+        with self.db:
+            self.db.executemany(
+                "DELETE FROM timers WHERE timestamp = ? AND job_type = ? AND job_name = ?",
+                [
+                    (int(timestamp), job_type, job_name)
+                    for timestamp, job_type, job_name in jobs
+                ],
+            )
+
+    # Migration
+
+    def import_tree(self, root="data"):
+        """Copies every data file this storage owns from a JSON data tree.
+
+        Returns how many files of each kind were imported."""
+        counts = {kind: 0 for kind in owned_files}
+        paths = [f"{root}/timers.json"]
+        for folder, filename in (
+            ("servers", "userlog.json"),
+            ("servers", "toss/tosses.json"),
+            ("users", "profile.json"),
+        ):
+            if os.path.isdir(f"{root}/{folder}"):
+                paths += [
+                    f"{root}/{folder}/{entry}/{filename}"
+                    for entry in os.listdir(f"{root}/{folder}")
+                ]
+
+        with self.db:
+            for path in paths:
+                if not os.path.isfile(path):
+                    continue
+                with open(path, "r") as f:
+                    document = json.load(f)
+                path = "data" + path[len(root) :]
+                if not self.owns(path):
+                    continue
+                self.replace(path, document)
+                counts[self.owns(path)[0]] += 1
+        return counts
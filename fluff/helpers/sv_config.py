@@ -1,24 +1,46 @@
 import yaml
 import shutil
 import os
-from jsonschema import validate
+from helpers.loadtimes import timed
 
 server_data = "data/servers"
-with open("assets/config.example.yml", "r") as f:
-    config_stock = yaml.safe_load(f)
-with open("assets/config.schema.yml", "r") as f:
-    config_schema = yaml.safe_load(f)
+# Read the first time a config is needed, see get_assets.
+config_stock = None
+config_schema = None
+validate = None
+# Validated configs, keyed by server ID, alongside the mtime they were read at.
+config_cache = {}
+
+
+def get_assets():
+    """Return the stock config and its schema, reading them the first time."""
+    global config_stock, config_schema
+    if not config_stock:
+        with timed("assets/config.example.yml"), open(
+            "assets/config.example.yml", "r"
+        ) as f:
+            config_stock = yaml.safe_load(f)
+        with timed("assets/config.schema.yml"), open(
+            "assets/config.schema.yml", "r"
+        ) as f:
+            config_schema = yaml.safe_load(f)
+    return config_stock, config_schema
 
 
 def validate_config(config):
-    validate(config, config_schema)
+    global validate
+    if not validate:
+        with timed("jsonschema"):
+            from jsonschema import validate
+    validate(config, get_assets()[1])
 
 
 def make_config(sid):
     if not os.path.exists(f"{server_data}/{sid}"):
         os.makedirs(f"{server_data}/{sid}")
     shutil.copyfile("assets/config.example.yml", f"{server_data}/{sid}/config.yml")
-    return config_stock
+    config_cache.pop(sid, None)
+    return get_assets()[0]
 
 
 def get_config(sid, part, key):
@@ -27,14 +49,25 @@ def get_config(sid, part, key):
     return config[part][key]
 
 
+def get_section(sid, part):
+    """Returns a whole config section, for when you need more than one key."""
+    return fill_config(sid)[part]
+
+
 def fill_config(sid):
-    config = (
-        get_raw_config(sid)
-        if os.path.exists(f"{server_data}/{sid}/config.yml")
-        else make_config(sid)
-    )
+    path = f"{server_data}/{sid}/config.yml"
+    if not os.path.exists(path):
+        config = make_config(sid)
+        validate_config(config)
+        return config
+
+    mtime = os.stat(path).st_mtime_ns
+    if sid in config_cache and config_cache[sid][0] == mtime:
+        return config_cache[sid][1]
 
+    config = get_raw_config(sid)
     validate_config(config)
+    config_cache[sid] = (mtime, config)
 
     return config
 
@@ -46,6 +79,7 @@ def get_raw_config(sid):
 
 
 def set_raw_config(sid, contents):
-    contents["metadata"]["version"] = config_stock["metadata"]["version"]
+    contents["metadata"]["version"] = get_assets()[0]["metadata"]["version"]
     with open(f"{server_data}/{sid}/config.yml", "w") as f:
         yaml.dump(contents, f, sort_keys=False)
+    config_cache.pop(sid, None)
@@ -0,0 +1,33 @@
+import os
+import sys
+import importlib.util
+import pytest
+
+# Tests run against the bot's own modules, imported the way the bot does.
+root = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fluff"
+)
+sys.path.insert(0, root)
+
+# Without a real config, the example one stands in for it.
+try:
+    import config
+except ImportError:
+    spec = importlib.util.spec_from_file_location(
+        "config", os.path.join(root, "config.example.py")
+    )
+    config = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(config)
+    sys.modules["config"] = config
+
+
+@pytest.fixture
+def datadir(tmp_path, monkeypatch):
+    """Runs a test in an empty folder, with a fresh data file cache."""
+    from helpers import datafiles
+
+    monkeypatch.chdir(tmp_path)
+    datafiles.uncache()
+    yield tmp_path
+    datafiles.flush_files()
+    datafiles.uncache()
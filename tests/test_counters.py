@@ -0,0 +1,20 @@
+from helpers import counters
+from helpers.counters import WindowCounter
+
+
+def test_window_counter(monkeypatch):
+    now = [1000]
+    monkeypatch.setattr(counters.time, "time", lambda: now[0])
+    counter = WindowCounter(60, limit=3)
+    assert counter.add("a") == 1
+    now[0] += 30
+    assert counter.add("a") == 2
+    now[0] += 31
+    # The first one has left the window.
+    assert counter.count("a") == 1
+    assert counter.add("a") == 2
+    assert counter.add("a") == 3
+    assert counter.add("a") == 3
+    now[0] += 60
+    assert "a" not in counter
+    assert counter.snapshot() == []
@@ -0,0 +1,84 @@
+import json
+import asyncio
+import pytest
+import config
+from helpers import datafiles
+from helpers.datafiles import (
+    get_botfile,
+    set_botfile,
+    get_guildfile,
+    set_guildfile,
+    add_userlog,
+    add_job,
+)
+
+
+def test_failed_flush_stays_pending(datadir, monkeypatch):
+    get_botfile("stuff")
+    real_save = datafiles.save_file
+
+    def broken_save(path, contents):
+        raise OSError("No space left on device")
+
+    async def run():
+        set_botfile("stuff", json.dumps({"a": 1}))
+        monkeypatch.setattr(datafiles, "save_file", broken_save)
+        monkeypatch.setattr(datafiles, "flush_retry", 0.05)
+        await asyncio.sleep(datafiles.flush_delay + 0.01)
+        assert "data/stuff.json" in datafiles.pending
+        monkeypatch.setattr(datafiles, "save_file", real_save)
+        await asyncio.sleep(0.1)
+
+    monkeypatch.setattr(datafiles, "flush_delay", 0.05)
+    asyncio.run(run())
+    assert not datafiles.pending
+    with open("data/stuff.json") as f:
+        assert json.load(f) == {"a": 1}
+
+
+@pytest.fixture
+def sqlite(datadir, monkeypatch):
+    monkeypatch.setattr(config, "storage", "sqlite", raising=False)
+    datafiles.load_storage()
+    yield datafiles.storage
+    datafiles.flush_files()
+    monkeypatch.undo()
+    datafiles.load_storage()
+
+
+class Issuer:
+    id = 1
+
+
+def test_row_write_after_pending_document(sqlite, monkeypatch):
+    monkeypatch.setattr(datafiles, "flush_delay", 0.05)
+
+    async def run():
+        userlogs = get_guildfile(10, "userlog")
+        userlogs["20"] = {"notes": [], "watch": {"state": False}}
+        set_guildfile(10, "userlog", json.dumps(userlogs))
+        add_userlog(10, 20, Issuer(), "Being rude.", "warns")
+        add_job("unban", 20, {"guild": 10}, 1000)
+        await asyncio.sleep(0.1)
+
+    asyncio.run(run())
+    datafiles.uncache()
+    assert [w["reason"] for w in get_guildfile(10, "userlog")["20"]["warns"]] == [
+        "Being rude."
+    ]
+    assert get_botfile("timers") == {"unban": {"1000": {"20": {"guild": 10}}}}
+
+
+def test_userlog_keeps_empty_lists(sqlite):
+    userlog = {
+        "20": {
+            "warns": [{"issuer_id": 1, "reason": "Being rude.", "timestamp": 5}],
+            "mutes": [],
+            "kicks": [],
+            "bans": [],
+            "notes": [],
+            "watch": {"state": False, "thread": None, "message": None},
+        }
+    }
+    sqlite.save("data/servers/10/userlog.json", json.dumps(userlog))
+    assert sqlite.load("data/servers/10/userlog.json") == userlog
@@ -0,0 +1,129 @@
+import os
+import types
+import asyncio
+import aiohttp
+from aiohttp import web
+from helpers import google
+from helpers.datafiles import get_botfile
+
+
+class StandInDrive:
+    """Just enough of Drive's resumable upload API to upload to.
+
+    The first `failures` chunks are cut off halfway and answered with a 503."""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.sessions = []
+        self.app = web.Application()
+        self.app.router.add_post("/upload/drive/v3/files", self.start)
+        self.app.router.add_put("/session/{session}", self.put)
+
+    async def __aenter__(self):
+        self.runner = web.AppRunner(self.app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        self.url = "http://127.0.0.1:%d" % site._server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.runner.cleanup()
+
+    def uploaded(self):
+        return {s["name"]: s["data"] for s in self.sessions}
+
+    async def start(self, request):
+        assert request.headers["Authorization"] == "Bearer token"
+        body = await request.json()
+        self.sessions.append(
+            {
+                "name": body["name"],
+                "size": int(request.headers["X-Upload-Content-Length"]),
+                "data": b"",
+            }
+        )
+        return web.Response(
+            headers={"Location": f"{self.url}/session/{len(self.sessions) - 1}"}
+        )
+
+    async def put(self, request):
+        session = self.sessions[int(request.match_info["session"])]
+        data = await request.read()
+        if data:
+            start = int(request.headers["Content-Range"].split()[1].split("-")[0])
+            assert start == len(session["data"])
+            if self.failures:
+                self.failures -= 1
+                session["data"] += data[: len(data) // 2]
+                return web.Response(status=503)
+            session["data"] += data
+        if len(session["data"]) == session["size"]:
+            return web.Response(status=200)
+        if not session["data"]:
+            return web.Response(status=308)
+        return web.Response(
+            status=308, headers={"Range": f"bytes=0-{len(session['data']) - 1}"}
+        )
+
+
+async def drain_uploads(drive):
+    async with aiohttp.ClientSession() as session:
+        worker = asyncio.create_task(google.upload_worker(session))
+        for _ in range(200):
+            await asyncio.sleep(0.05)
+            if not get_botfile("uploads"):
+                break
+        worker.cancel()
+
+
+def upload_archive(monkeypatch, failures, folder="folder"):
+    monkeypatch.setattr(google, "get_token", lambda: "token")
+    monkeypatch.setattr(google, "get_config", lambda sid, part, key: folder)
+    monkeypatch.setattr(google, "service_account", "service_account.json")
+    with open("service_account.json", "w") as f:
+        f.write("{}")
+    monkeypatch.setattr(google, "chunk_size", 256 * 1024)
+    monkeypatch.setattr(google, "retry_base", 0.05)
+    files = os.urandom(1024 * 1024)
+    with open("log (files).zip", "wb") as f:
+        f.write(files)
+    with open("log.txt", "w") as f:
+        f.write("hello")
+
+    async def run():
+        async with StandInDrive(failures) as drive:
+            monkeypatch.setattr(google, "api_url", drive.url)
+            # Events belong to the loop they were first awaited on.
+            monkeypatch.setattr(google, "uploads_changed", asyncio.Event())
+            ctx = types.SimpleNamespace(guild=types.SimpleNamespace(id=1))
+            await google.upload(ctx, "log", "", "log (files).zip")
+            await drain_uploads(drive)
+            return drive
+
+    return files, asyncio.run(run())
+
+
+def test_upload(datadir, monkeypatch):
+    files, drive = upload_archive(monkeypatch, failures=0)
+    assert drive.uploaded() == {"log.txt": b"hello", "log (files).zip": files}
+    assert not get_botfile("uploads")
+    # The text is on Drive now, the zip is kept.
+    assert not os.path.exists("log.txt")
+    assert os.path.exists("log (files).zip")
+
+
+def test_upload_resumes_after_failures(datadir, monkeypatch):
+    files, drive = upload_archive(monkeypatch, failures=2)
+    # Picked up where Drive left off, in the same session.
+    assert len(drive.sessions) == 2
+    assert drive.uploaded() == {"log.txt": b"hello", "log (files).zip": files}
+    assert not get_botfile("uploads")
+    assert not os.path.exists("log.txt")
+
+
+def test_upload_without_folder(datadir, monkeypatch):
+    files, drive = upload_archive(monkeypatch, failures=0, folder=None)
+    assert not drive.sessions
+    assert not get_botfile("uploads")
+    assert os.path.exists("log.txt")
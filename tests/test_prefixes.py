@@ -0,0 +1,16 @@
+from helpers import prefixes
+
+
+def test_user_caches_are_bounded(datadir, monkeypatch):
+    monkeypatch.setattr(prefixes, "userprefixes", prefixes.OrderedDict())
+    monkeypatch.setattr(prefixes, "aliastries", prefixes.OrderedDict())
+    monkeypatch.setattr(prefixes, "usercache_size", 3)
+    for uid in range(5):
+        prefixes.get_userprefixes(uid)
+        prefixes.match_alias(uid, "pls")
+    prefixes.get_userprefixes(2)
+    prefixes.set_useraliases(1, [{"help": "h"}])
+
+    assert list(prefixes.userprefixes) == [3, 4, 2]
+    assert list(prefixes.aliastries) == [3, 4, 1]
+    assert prefixes.match_alias(1, "hi") == ("h", "help")
@@ -0,0 +1,39 @@
+"""Times get_config with and without the config cache.
+
+Run from anywhere: python tools/bench_config.py [calls]"""
+
+import os
+import sys
+import shutil
+import timeit
+import tempfile
+
+root = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fluff"
+)
+sys.path.insert(0, root)
+
+from helpers import sv_config
+
+
+def uncached(sid, part, key):
+    # What every get_config call did before configs were cached.
+    config = sv_config.get_raw_config(sid)
+    sv_config.validate_config(config)
+    return config[part][key]
+
+
+def main(calls=2000):
+    with tempfile.TemporaryDirectory() as workdir:
+        shutil.copytree(os.path.join(root, "assets"), os.path.join(workdir, "assets"))
+        os.chdir(workdir)
+        sv_config.make_config(1)
+        sv_config.get_config(1, "toss", "tossrole")
+
+        for name, get in (("uncached", uncached), ("cached", sv_config.get_config)):
+            seconds = timeit.timeit(lambda: get(1, "toss", "tossrole"), number=calls)
+            print(f"{name:>8}: {seconds / calls * 1e6:8.1f} us/call")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))